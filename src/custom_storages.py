@@ -5,3 +5,15 @@ from storages.backends.s3boto3 import S3Boto3Storage
 class ReportStorage(S3Boto3Storage):
     bucket_name = settings.REPORTS_BUCKET
     location = settings.REPORT_FILES_LOCATION
+
+
+class FetchCacheStorage(S3Boto3Storage):
+    bucket_name = settings.FETCH_CACHE_BUCKET
+    location = settings.FETCH_CACHE_LOCATION
+    # Cache entries are rewritten in place when a page is fetched again
+    file_overwrite = True
+
+
+class ParseDocumentStorage(S3Boto3Storage):
+    bucket_name = settings.PARSE_DOCUMENT_BUCKET
+    location = settings.PARSE_DOCUMENT_LOCATION
@@ -0,0 +1,176 @@
+import re
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from detective.management.commands.serve_crawl_fixture import (
+    add_fixture_arguments,
+    fixture_site,
+)
+from detective.models import Company
+from detective.utils.crawl.engine import AsyncCrawler
+from detective.utils.crawl.extraction import BACKENDS, extract_page
+from detective.utils.crawl.frontier import CrawlFrontier
+from detective.utils.crawl.proxies import is_local_host
+from detective.utils.crawl.relevance import RelevanceScorer
+from detective.utils.scraper import Scraper
+
+
+def _glob_escape(value: str) -> str:
+    return re.sub(r"([*?\[\]\\])", r"\\\1", value)
+
+
+@contextmanager
+def restored_redis_keys(*patterns):
+    """
+    Puts the Redis keys matching the glob patterns back as they were before the block: keys
+    it created are deleted, and keys it changed or deleted are restored with their TTL
+    """
+    redis = settings.REDIS_BINARY_CONN
+
+    def matching() -> set:
+        return {key for pattern in patterns for key in redis.scan_iter(match=pattern, count=1000)}
+
+    saved = {key: (redis.dump(key), redis.pttl(key)) for key in matching()}
+    try:
+        yield
+    finally:
+        written = matching() | set(saved)
+        if written:
+            redis.delete(*written)
+        for key, (dump, ttl) in saved.items():
+            if dump is not None:
+                redis.restore(key, max(ttl, 0), dump, replace=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Crawl a site recorded to WARC files (or a running fixture server) with the crawl "
+        "engine and report its throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*", help="WARC files, or directories holding them, to serve"
+        )
+        parser.add_argument("--url", help="Site to crawl instead, e.g. a serve_crawl_fixture")
+        parser.add_argument("--start-path", default="/", help="Path the crawl starts from")
+        parser.add_argument("--max-pages", type=int, default=500, help="Pages to crawl")
+        parser.add_argument("--concurrency", type=int, help="Overrides CRAWL_CONCURRENCY")
+        parser.add_argument(
+            "--host-rate",
+            type=float,
+            help="Overrides the starting and maximum per-host rate (requests per second)",
+        )
+        add_fixture_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options["paths"] and options["url"]:
+            raise CommandError("Pass either WARC files or --url, not both")
+        if not options["paths"] and not options["url"]:
+            raise CommandError("No site to crawl; pass WARC files or --url")
+
+        overrides = {
+            # A benchmark measures fetching: nothing is recorded or served from the fetch cache
+            "CRAWL_WARC_DIR": "",
+            "FETCH_CACHE_BACKEND": "",
+            "FETCH_CACHE_REPLAY": False,
+        }
+        if options["concurrency"]:
+            overrides["CRAWL_CONCURRENCY"] = options["concurrency"]
+        if options["host_rate"]:
+            overrides.update(
+                CRAWL_HOST_RATE=options["host_rate"],
+                CRAWL_HOST_MAX_RATE=options["host_rate"],
+                CRAWL_HOST_BURST=max(options["host_rate"], 1),
+            )
+
+        site = None
+        if options["paths"]:
+            site = fixture_site(options["paths"], options)
+            base_url = site.start()
+        else:
+            base_url = options["url"]
+        start_url = urljoin(base_url, options["start_path"])
+
+        # The crawl engine works for a company; a throwaway one keeps its state apart. Its
+        # Redis keys, and those of the crawled host, are left as they were before the run.
+        company = Company.objects.create(
+            name="Crawl benchmark", domain=f"benchmark-{uuid.uuid4().hex}"
+        )
+        host = _glob_escape(urlparse(start_url).netloc)
+        try:
+            with restored_redis_keys(f"gd:*{company.uuid}*", f"gd:*:{host}*"):
+                with override_settings(**overrides):
+                    pages, elapsed = self._crawl(company, start_url, options["max_pages"])
+        finally:
+            company.delete()
+            if site is not None:
+                site.stop()
+
+        self._report(pages, elapsed, site)
+
+    def _crawl(self, company, start_url, max_pages):
+        scraper = Scraper(company.uuid, start_url)
+        frontier = CrawlFrontier(company.uuid)
+        host = urlparse(start_url).netloc
+        # Start from the configured rate limit and bypass order, not what a previous run learned
+        scraper.redis.delete(scraper.host_limiter._key(host), scraper.bypass._key(host))
+        frontier.start(start_url, max_pages)
+        if not is_local_host(host):
+            self.stdout.write(f"{host} is not local; blocked pages may be fetched via proxies")
+
+        pages = []
+
+        def collect(url, content, content_type, validators):
+            pages.append((url, content, content_type))
+
+        started = time.perf_counter()
+        AsyncCrawler(
+            scraper, frontier, on_content=collect, scorer=RelevanceScorer.from_glossary()
+        ).crawl()
+        return pages, time.perf_counter() - started
+
+    def _report(self, pages, elapsed, site):
+        if not pages:
+            raise CommandError("No pages were crawled")
+
+        total_bytes = sum(len(content) for _, content, _ in pages)
+        self.stdout.write(
+            f"Crawled {len(pages)} pages, {total_bytes / 1024 / 1024:.1f}MB in {elapsed:.1f}s: "
+            f"{len(pages) / elapsed:.1f} pages/s, {total_bytes / 1024 / elapsed:.0f}KB/s"
+        )
+
+        # Extraction is timed after the crawl, so the backends are compared on the same pages
+        html_pages = [
+            (url, content, content_type)
+            for url, content, content_type in pages
+            if not content_type or "html" in content_type
+        ]
+        timings = Counter()
+        for url, content, content_type in html_pages:
+            for backend in BACKENDS:
+                started = time.perf_counter()
+                extract_page(content, url, backend=backend, content_type=content_type)
+                timings[backend] += time.perf_counter() - started
+        if html_pages:
+            self.stdout.write(
+                f"Extraction of {len(html_pages)} HTML pages: "
+                + ", ".join(
+                    f"{backend} {seconds:.2f}s ({seconds / len(html_pages) * 1000:.1f}ms/page)"
+                    for backend, seconds in timings.items()
+                )
+            )
+
+        if site is not None:
+            self.stdout.write(
+                "Fixture server: "
+                + ", ".join(f"{name}: {count}" for name, count in site.stats.items())
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(pages) / elapsed:.1f} pages/s"))
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import time
+from urllib.parse import urlparse
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from detective.utils.crawl.extraction import BACKENDS, extract_page
+from detective.utils.crawl.http_client import get_http_session
+
+
+class Command(BaseCommand):
+    help = "Compare HTML extraction backends on captured pages (files, directories or URLs)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*", help="Captured .html files, or directories holding them"
+        )
+        parser.add_argument("--url", action="append", default=[], help="Page to fetch and time")
+        parser.add_argument(
+            "--save-dir", help="Directory to save fetched pages in, for repeatable runs"
+        )
+        parser.add_argument("--repeat", type=int, default=10, help="Extractions per page")
+
+    def handle(self, *args, **options):
+        pages = self._load_files(options["paths"])
+        pages.extend(self._fetch(options["url"], options["save_dir"]))
+        if not pages:
+            raise CommandError("No pages to benchmark; pass captured .html files or --url")
+
+        repeat = max(1, options["repeat"])
+        totals = dict.fromkeys(BACKENDS, 0.0)
+
+        for name, base_url, content in pages:
+            timings = {}
+            results = {}
+            for backend in BACKENDS:
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    results[backend] = extract_page(content, base_url, backend=backend)
+                timings[backend] = (time.perf_counter() - started) / repeat * 1000
+                totals[backend] += timings[backend]
+
+            lxml_page, soup_page = results["lxml"], results["bs4"]
+            same = (
+                lxml_page.text == soup_page.text
+                and lxml_page.links == soup_page.links
+                and lxml_page.canonical == soup_page.canonical
+            )
+            self.stdout.write(
+                f"{name}: {len(content) // 1024}KB, "
+                + ", ".join(f"{backend} {ms:.1f}ms" for backend, ms in timings.items())
+                + f", {timings['bs4'] / timings['lxml']:.1f}x"
+                + ("" if same else " (output differs)")
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(pages)} pages: "
+                + ", ".join(f"{backend} {ms:.1f}ms" for backend, ms in totals.items())
+                + f", lxml is {totals['bs4'] / totals['lxml']:.1f}x faster"
+            )
+        )
+
+    def _load_files(self, paths):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(
+                    os.path.join(path, name)
+                    for name in sorted(os.listdir(path))
+                    if name.endswith((".html", ".htm"))
+                )
+            elif os.path.isfile(path):
+                files.append(path)
+            else:
+                raise CommandError(f"{path} does not exist")
+
+        pages = []
+        for path in files:
+            with open(path, "rb") as f:
+                pages.append((os.path.basename(path), "https://example.com/", f.read()))
+        return pages
+
+    def _fetch(self, urls, save_dir):
+        pages = []
+        for url in urls:
+            try:
+                response = get_http_session().get(url, timeout=30)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                self.stdout.write(self.style.ERROR(f"Failed to fetch {url}: {e}"))
+                continue
+
+            pages.append((url, url, response.content))
+            if save_dir:
+                os.makedirs(save_dir, exist_ok=True)
+                name = urlparse(url).netloc + "-" + hashlib.md5(url.encode()).hexdigest()[:8]
+                with open(os.path.join(save_dir, f"{name}.html"), "wb") as f:
+                    f.write(response.content)
+        return pages
@@ -0,0 +1,82 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detective.utils.crawl.fixture_site import FixtureSite
+
+
+def warc_files(paths):
+    """
+    WARC files from the given files, or directories holding them
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith((".warc", ".warc.gz"))
+            )
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise CommandError(f"{path} does not exist")
+    if not files:
+        raise CommandError("No WARC files found")
+    return files
+
+
+def add_fixture_arguments(parser):
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds each response is delayed"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random +/- seconds added to the latency"
+    )
+    parser.add_argument(
+        "--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429"
+    )
+    parser.add_argument(
+        "--challenge-rate",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with a Cloudflare-style challenge page",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the injected failures")
+
+
+def fixture_site(paths, options) -> FixtureSite:
+    return FixtureSite(
+        warc_files(paths),
+        latency=options["latency"],
+        jitter=options["jitter"],
+        throttle_rate=options["throttle_rate"],
+        challenge_rate=options["challenge_rate"],
+        seed=options["seed"],
+    )
+
+
+class Command(BaseCommand):
+    help = "Serve pages recorded to WARC files (CRAWL_WARC_DIR) as a local site to crawl"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="WARC files, or directories holding them")
+        parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+        parser.add_argument("--port", type=int, default=8800, help="Port to listen on")
+        add_fixture_arguments(parser)
+
+    def handle(self, *args, **options):
+        site = fixture_site(options["paths"], options)
+        url = site.start(options["host"], options["port"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Serving {len(site.pages)} pages at {url}/ (Ctrl-C to stop)")
+        )
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            site.stop()
+        self.stdout.write(", ".join(f"{name}: {count}" for name, count in site.stats.items()))
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detective', '0008_alter_report_urls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staging',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='staging',
+            name='etag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='staging',
+            name='last_modified',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detective', '0009_staging_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staging',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='detective.staging'),
+        ),
+        migrations.AlterField(
+            model_name='staging',
+            name='processed',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('PROCESSED', 'Processed'), ('FAILED', 'Failed'), ('DUPLICATE', 'Duplicate')], default='PENDING', max_length=255),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:20
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def populate_url_hashes(apps, schema_editor):
+    Staging = apps.get_model('detective', 'Staging')
+
+    # Rows of the same page are numbered in the order they were created, so existing rows
+    # are unique on (company, url_hash, chunk) before 0012 adds the constraint
+    batch = []
+    previous = None
+    chunk = 0
+    rows = Staging.objects.only('uuid', 'company_id', 'url').order_by('company_id', 'url', 'created_at')
+    for staging in rows.iterator(chunk_size=2000):
+        key = (staging.company_id, staging.url)
+        chunk = chunk + 1 if key == previous else 0
+        previous = key
+
+        staging.url_hash = hashlib.sha256(staging.url.encode('utf-8')).hexdigest()
+        staging.chunk = chunk
+        batch.append(staging)
+        if len(batch) >= 2000:
+            Staging.objects.bulk_update(batch, ['url_hash', 'chunk'])
+            batch = []
+    if batch:
+        Staging.objects.bulk_update(batch, ['url_hash', 'chunk'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detective', '0010_staging_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staging',
+            name='chunk',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='staging',
+            name='url_hash',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.RunPython(populate_url_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detective', '0011_staging_url_hash'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='staging',
+            constraint=models.UniqueConstraint(fields=('company', 'url_hash', 'chunk'), name='unique_staging_url_chunk'),
+        ),
+    ]
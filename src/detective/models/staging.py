@@ -1,5 +1,6 @@
 from django.db import models
 from detective.models.company import Company
+import hashlib
 import uuid
 
 
@@ -8,12 +9,14 @@ class Staging(models.Model):
     STATUS_PROCESSING = "PROCESSING"
     STATUS_PROCESSED = "PROCESSED"
     STATUS_FAILED = "FAILED"
+    STATUS_DUPLICATE = "DUPLICATE"
 
     PROCESSED_STATUSES = [
         (STATUS_PENDING, "Pending"),
         (STATUS_PROCESSING, "Processing"),
         (STATUS_PROCESSED, "Processed"),
         (STATUS_FAILED, "Failed"),
+        (STATUS_DUPLICATE, "Duplicate"),
     ]
 
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -24,6 +27,33 @@ class Staging(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     defunct = models.BooleanField(default=False)
+    # HTTP validators and text fingerprint of the page, used to skip unchanged pages on re-crawls
+    etag = models.CharField(max_length=255, blank=True, default="")
+    last_modified = models.CharField(max_length=64, blank=True, default="")
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    # Near-duplicate pages point at the staged page they copy and are not analysed themselves
+    duplicate_of = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.SET_NULL, related_name="duplicates"
+    )
+    # Fixed-width fingerprint of url; lookups go through it rather than the 2048-character url
+    url_hash = models.CharField(max_length=64, default="")
+    # Position of this row in the page's text, which is split into MAX_CONTENT_LENGTH pieces
+    chunk = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "url_hash", "chunk"], name="unique_staging_url_chunk"
+            )
+        ]
 
     def __str__(self):
         return f"Company Staging {self.uuid} for Company {self.company}"
+
+    def save(self, *args, **kwargs):
+        self.url_hash = self.hash_url(self.url)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def hash_url(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
@@ -1,4 +1,5 @@
 from .general import *
 from .scraping import *
+from .parsing import *
 from .pre_staging import *
 from .post_staging import *
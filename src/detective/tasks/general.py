@@ -12,6 +12,9 @@ from .helpers import (
 )
 from .post_staging import process_company_statistics
 from .pre_staging import process_raw_statistics
+from detective.utils.crawl.documents import RawDocumentStore
+from detective.utils.crawl.fetch_cache import FetchCache
+from detective.utils.crawl.proxies import ProxyPool
 from django.db.models import Q
 import logging
 
@@ -168,3 +171,28 @@ def check_statistics_completion(company_id: int) -> None:
         process_company_statistics.delay(company_id)
 
     logger.info("Statistics completion check finished")
+
+
+@shared_task(queue=settings.CELERY_QUEUE_GENERAL)
+def refresh_proxy_pool() -> None:
+    """
+    Tests and rescores the shared proxy pool. Runs on the beat schedule so fetches never wait
+    for proxy discovery.
+    """
+    ProxyPool().refresh()
+
+
+@shared_task(queue=settings.CELERY_QUEUE_GENERAL)
+def evict_fetch_cache() -> None:
+    """
+    Removes expired responses from the fetch cache and trims it to FETCH_CACHE_MAX_BYTES
+    """
+    FetchCache().evict()
+
+
+@shared_task(queue=settings.CELERY_QUEUE_GENERAL)
+def evict_parse_documents() -> None:
+    """
+    Removes fetched PDFs that no gd_parse worker picked up within PARSE_DOCUMENT_TTL
+    """
+    RawDocumentStore().evict()
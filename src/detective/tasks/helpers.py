@@ -1,14 +1,22 @@
 from detective.models import Report, Company, RawStatistics, Staging
 from detective.utils import StatisticsProcessor, Scraper, Assistant, Completion
-from detective.tasks.scraping import crawl_domain, scrape_single_url
+from detective.utils.crawl import CrawlFrontier, RelevanceScorer
+from detective.utils.crawl.canonical import CanonicalUrls, canonicalize_url
+from detective.utils.crawl.sitemap import SitemapDiscovery
+from detective.tasks.scraping import scrape_and_parse, start_crawl
 from datetime import datetime, timezone, timedelta
 import logging
 from celery import chord
+from django.conf import settings
+from django.db.models import Max
 
 logger = logging.getLogger(__name__)
 
 RECORDS_EXPIRE_AFTER_DAYS = 7
 
+# Keeps url__in lookups well under database parameter limits
+LOOKUP_BATCH_SIZE = 1000
+
 
 def move_report_to_processing(report: Report) -> None:
     """
@@ -51,18 +59,20 @@ def check_skip_scraping(company_id: int) -> bool:
 def scrape_domain(company_id: int, domain: str, report: Report, skip_scraping: bool) -> None:
     """
     Scrapes the domain if necessary. Uses a chord to ensure all scraping completes before proceeding.
+    Every task in the chord completes only once the pages it fetched are staged.
     """
     from detective.tasks.general import process_after_scraping
 
     if not skip_scraping:
         scraping_tasks = []
         if report.urls and len(report.urls) > 0:
-            # If specific URLs are provided, process them directly
+            # If specific URLs are provided, fetch and stage each of them in a chain
             for url in report.urls:
-                scraping_tasks.append(scrape_single_url.s(company_id, url))
+                scraping_tasks.append(scrape_and_parse(company_id, url))
         else:
-            # Otherwise, start a full domain crawl which will generate its own tasks
-            scraping_tasks.append(crawl_domain.s(company_id, domain))
+            # Otherwise, crawl the domain from the shared Redis frontier. Seeding it from the
+            # sitemaps and starting the crawl happens on a gd_scrape worker.
+            start_crawl.delay(company_id, domain, str(report.uuid))
 
         if scraping_tasks:
             # Create a chord - after all scraping tasks complete, call process_after_scraping
@@ -70,19 +80,86 @@ def scrape_domain(company_id: int, domain: str, report: Report, skip_scraping: b
             chord(scraping_tasks)(process_after_scraping.si(company_id, report.uuid))
 
 
+def seed_crawl_frontier(company_id: int, domain: str) -> CrawlFrontier:
+    """
+    Starts the company's crawl frontier, seeding a fresh crawl in bulk from the domain's
+    sitemaps, ranked by relevance. Pages whose staged copy is newer than their sitemap lastmod
+    are marked visited instead of queued, so re-crawls only fetch what changed.
+    """
+    frontier = CrawlFrontier(company_id)
+    if frontier.start(domain, Scraper.MAX_LINKS) or not settings.CRAWL_USE_SITEMAPS:
+        return frontier
+
+    scraper = Scraper(company_id, domain)
+    sitemap = SitemapDiscovery(domain, scraper.headers).discover()
+    same_domain = [url for url in sitemap if scraper._is_same_domain(url)]
+    pages = {
+        canonical: sitemap[url] for url, canonical in scraper._resolve_urls(same_domain).items()
+    }
+
+    unchanged = get_unchanged_pages(company_id, pages)
+    if unchanged:
+        frontier.mark_visited(unchanged)
+
+    scorer = RelevanceScorer.from_glossary()
+    added = frontier.add({url: scorer.score(url) for url in pages if url not in unchanged})
+    frontier.checkpoint()
+    logger.info(
+        f"Seeded crawl of {domain} with {len(added)} sitemap URLs, "
+        f"skipped {len(unchanged)} unchanged pages"
+    )
+    return frontier
+
+
+def get_unchanged_pages(company_id: int, pages: dict) -> set:
+    """
+    Returns the URLs in {url: lastmod} whose staged copy was refreshed at or after lastmod,
+    and marks those copies as refreshed again.
+    """
+    candidates = [url for url, lastmod in pages.items() if lastmod]
+    unchanged = set()
+
+    for i in range(0, len(candidates), LOOKUP_BATCH_SIZE):
+        batch = {Staging.hash_url(url): url for url in candidates[i : i + LOOKUP_BATCH_SIZE]}
+        staged = (
+            Staging.objects.filter(company_id=company_id, defunct=False, url_hash__in=batch)
+            .values("url_hash")
+            .annotate(refreshed_at=Max("updated_at"))
+        )
+        batch_unchanged = [
+            row["url_hash"]
+            for row in staged
+            if row["refreshed_at"] >= pages[batch[row["url_hash"]]]
+        ]
+        if batch_unchanged:
+            Staging.objects.filter(company_id=company_id, url_hash__in=batch_unchanged).update(
+                updated_at=datetime.now(timezone.utc)
+            )
+            unchanged.update(batch[url_hash] for url_hash in batch_unchanged)
+
+    return unchanged
+
+
 def process_urls(company_id: int, company: Company, report: Report) -> None:
     """
     Processes the URLs for the company and the report.
     """
 
     urls_to_process = report.urls if report.urls and len(report.urls) > 0 else None
+    if urls_to_process:
+        # The pages were staged under their canonical URLs
+        canonical = CanonicalUrls(company.uuid).resolve(
+            canonicalize_url(url) for url in urls_to_process
+        )
+        urls_to_process = list(canonical.values())
+        url_hashes = [Staging.hash_url(url) for url in urls_to_process]
 
     expire_date = datetime.now(timezone.utc) - timedelta(days=RECORDS_EXPIRE_AFTER_DAYS)
 
     # If urls_to_process is not empty, then mark all records apart from the ones in urls_to_process as defunct
     if urls_to_process:
         defunct_staging = Staging.objects.filter(company_id=company_id, defunct=False).exclude(
-            url__in=urls_to_process
+            url_hash__in=url_hashes
         )
 
         defunct_staging.update(defunct=True)
@@ -94,9 +171,9 @@ def process_urls(company_id: int, company: Company, report: Report) -> None:
         pending_staging = Staging.objects.filter(
             company_id=company_id,
             defunct=False,
-            url__in=urls_to_process,
+            url_hash__in=url_hashes,
             updated_at__lt=expire_date,
-        )
+        ).exclude(processed=Staging.STATUS_DUPLICATE)
 
         if pending_staging.count() > 0:
             pending_staging.update(processed=Staging.STATUS_PENDING)
@@ -110,7 +187,7 @@ def process_urls(company_id: int, company: Company, report: Report) -> None:
         # Only mark records as pending if they haven't been updated in the last week
         pending_staging = Staging.objects.filter(
             company_id=company_id, updated_at__lt=expire_date
-        )
+        ).exclude(processed=Staging.STATUS_DUPLICATE)
 
         if pending_staging.count() > 0:
             pending_staging.update(processed=Staging.STATUS_PENDING, defunct=False)
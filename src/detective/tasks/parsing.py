@@ -0,0 +1,141 @@
+from celery import shared_task, states
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django_celery_results.models import TaskResult
+from detective.utils import Scraper
+from detective.utils.crawl.documents import RawDocumentStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keeps task_id__in lookups well under database parameter limits
+RESULT_LOOKUP_BATCH_SIZE = 1000
+
+
+def fetched_document(
+    url: str,
+    content,
+    content_type: str = "",
+    validators: dict = None,
+    staged: dict = None,
+) -> dict:
+    """
+    Stores a fetched document, as bytes or a binary file, for the gd_parse workers. Returns
+    the arguments of parse_document for it.
+    """
+    return {
+        "url": url,
+        "document_key": RawDocumentStore().put(content),
+        "content_type": content_type,
+        "validators": validators or {},
+        "staged": staged,
+    }
+
+
+def queue_parse(
+    company_id: int,
+    url: str,
+    content: bytes,
+    content_type: str = "",
+    validators: dict = None,
+    staged: dict = None,
+) -> str:
+    """
+    Hands a fetched document to the gd_parse workers, which extract its text and stage it.
+    Returns the id of the parse task.
+    """
+    document = fetched_document(url, content, content_type, validators, staged)
+    return parse_document.delay(company_id, **document).id
+
+
+@shared_task(
+    queue=settings.CELERY_QUEUE_PARSE,
+    rate_limit=settings.CELERY_RATE_LIMIT_PARSE,
+    soft_time_limit=settings.CELERY_PARSE_SOFT_TIME_LIMIT,
+    time_limit=settings.CELERY_PARSE_TIME_LIMIT,
+)
+def parse_document(
+    company_id: int,
+    url: str,
+    document_key: str,
+    content_type: str = "",
+    validators: dict = None,
+    staged: dict = None,
+) -> None:
+    """
+    Extracts the text of a fetched page or PDF and saves it to staging. Parsing runs here
+    rather than on the I/O-bound gd_scrape workers, so a large PDF never holds up fetches, and
+    each document is cut off at CELERY_PARSE_SOFT_TIME_LIMIT. The page's rows are written
+    before the task completes.
+
+    staged is the content hash of the page's staged copy as {"content_hash": ...}, {} if the
+    page is not staged, or None to look it up here. The crawl passes what it already looked
+    up for a batch of pages.
+    """
+    try:
+        with RawDocumentStore().take(document_key) as document:
+            if document is None:
+                logger.warning(f"Fetched content of {url} expired before it was parsed")
+                return
+            scraper = Scraper.for_company(company_id, url)
+            text = scraper._parse_content(url, document, content_type)
+
+        if staged is None:
+            staged = scraper._get_staged(url)
+        scraper._save_page(url, text, staged or None, validators)
+
+    except SoftTimeLimitExceeded:
+        logger.error(f"Gave up parsing {url} after {settings.CELERY_PARSE_SOFT_TIME_LIMIT}s")
+
+    except Exception as e:
+        logger.error(f"Error parsing {url}: {e}")
+
+
+@shared_task(
+    queue=settings.CELERY_QUEUE_PARSE,
+    rate_limit=settings.CELERY_RATE_LIMIT_PARSE,
+    soft_time_limit=settings.CELERY_PARSE_SOFT_TIME_LIMIT,
+    time_limit=settings.CELERY_PARSE_TIME_LIMIT,
+)
+def parse_fetched(document: dict, company_id: int) -> None:
+    """
+    Parses the document a scrape_single_url task fetched, as the next step of its chain, so a
+    chord over the chains completes only once the pages are staged
+    """
+    if document is not None:
+        parse_document(company_id, **document)
+
+
+def _unfinished(task_ids: list) -> list:
+    finished = set()
+    for i in range(0, len(task_ids), RESULT_LOOKUP_BATCH_SIZE):
+        finished.update(
+            TaskResult.objects.filter(
+                task_id__in=task_ids[i : i + RESULT_LOOKUP_BATCH_SIZE],
+                status__in=states.READY_STATES,
+            ).values_list("task_id", flat=True)
+        )
+    return [task_id for task_id in task_ids if task_id not in finished]
+
+
+@shared_task(
+    bind=True,
+    queue=settings.CELERY_QUEUE_GENERAL,
+    max_retries=settings.PARSE_WAIT_TIMEOUT // settings.PARSE_WAIT_INTERVAL,
+)
+def wait_for_parsing(self, task_ids: list) -> None:
+    """
+    Completes once the given parse tasks have finished. A crawl task is replaced with it, so a
+    chord waiting on the crawl waits for its pages to be staged, without holding a worker.
+    """
+    pending = _unfinished(task_ids)
+    if not pending:
+        return
+    if self.request.retries >= self.max_retries:
+        logger.error(
+            f"{len(pending)} documents were not parsed after {settings.PARSE_WAIT_TIMEOUT}s, "
+            "continuing without them"
+        )
+        return
+    logger.info(f"Waiting for {len(pending)} documents to be parsed")
+    raise self.retry(args=(pending,), countdown=settings.PARSE_WAIT_INTERVAL)
@@ -98,8 +98,12 @@ def trigger_staging_assistant(staging_uuid: str) -> None:
     staging = Staging.objects.get(uuid=staging_uuid)
 
     # Get progress percentage
-    # Get the total number of staging records for the company
-    total_staging_records = Staging.objects.filter(company_id=staging.company_id).count()
+    # Get the total number of staging records for the company, leaving out near-duplicates
+    total_staging_records = (
+        Staging.objects.filter(company_id=staging.company_id)
+        .exclude(processed=Staging.STATUS_DUPLICATE)
+        .count()
+    )
 
     # Get the number of staging records that have been processed
     processed_staging_records = Staging.objects.filter(
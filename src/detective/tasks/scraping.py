@@ -1,44 +1,148 @@
-from celery import shared_task, group
+from celery import chord, shared_task, group
+from celery.exceptions import SoftTimeLimitExceeded
 from django.conf import settings
 from detective.utils import Scraper
+from detective.utils.crawl import AsyncCrawler, CrawlFrontier, RelevanceScorer
+from detective.utils.crawl.host_limiter import HostUnavailable
 from detective.models import Staging
+from .parsing import fetched_document, parse_fetched, queue_parse, wait_for_parsing
+from datetime import datetime, timezone, timedelta
 import logging
+import threading
 import time
-import requests
-import random
 
 logger = logging.getLogger(__name__)
 
+# How many times a URL is retried while its host is paused before it is given up
+MAX_HOST_DEFERRALS = 3
 
-@shared_task(queue=settings.CELERY_QUEUE_SCRAPE, rate_limit=settings.CELERY_RATE_LIMIT_SCRAPE)
+
+def _expire_date() -> datetime:
+    from detective.tasks.helpers import RECORDS_EXPIRE_AFTER_DAYS
+
+    return datetime.now(timezone.utc) - timedelta(days=RECORDS_EXPIRE_AFTER_DAYS)
+
+
+def _is_recently_staged(staged: dict) -> bool:
+    """
+    Checks if a staged copy was refreshed within the window in which records are still current
+    """
+    return staged["updated_at"] >= _expire_date()
+
+
+def _staged_copies(company_id: int, urls: list) -> dict:
+    """
+    Returns the content hash and last refresh time of the staged copy of each URL that has
+    one, in one indexed lookup for the batch
+    """
+    hashes = {Staging.hash_url(url): url for url in urls}
+    rows = (
+        Staging.objects.filter(company_id=company_id, url_hash__in=hashes)
+        .order_by("url_hash", "-updated_at")
+        .values("url_hash", "content_hash", "updated_at")
+    )
+    staged = {}
+    for row in rows:
+        # The most recently refreshed row of each page comes first
+        staged.setdefault(
+            hashes[row["url_hash"]],
+            {"content_hash": row["content_hash"], "updated_at": row["updated_at"]},
+        )
+    return staged
+
+
+def _recently_staged_urls(company_id: int, urls: list) -> set:
+    """
+    Returns the URLs whose staged copy is still current, in one indexed lookup for the batch
+    """
+    return {
+        url
+        for url, staged in _staged_copies(company_id, urls).items()
+        if _is_recently_staged(staged)
+    }
+
+
+def _staged_hash(staged: dict) -> dict:
+    """
+    The part of a staged copy parse_document needs, {} for a page that is not staged
+    """
+    return {"content_hash": staged["content_hash"]} if staged else {}
+
+
+def scrape_and_parse(company_id: int, url: str, **kwargs):
+    """
+    Signature of a chain that fetches a URL and then stages it, completing once it is staged
+    """
+    return scrape_single_url.s(company_id, url, **kwargs) | parse_fetched.s(company_id)
+
+
+@shared_task(
+    bind=True,
+    queue=settings.CELERY_QUEUE_SCRAPE,
+    rate_limit=settings.CELERY_RATE_LIMIT_SCRAPE,
+    max_retries=MAX_HOST_DEFERRALS,
+)
 def scrape_single_url(
-    company_id: int, url: str, total_urls: int = None, current_index: int = None
-) -> None:
+    self, company_id: int, url: str, total_urls: int = None, current_index: int = None
+) -> dict:
     """
-    Scrapes a single URL and saves the content to staging
+    Fetches a single URL and stores it for the gd_parse workers. Returns the arguments of
+    parse_document for the page, or None if there is nothing to stage; scrape_and_parse
+    chains the two. If the host is paused by its rate limiter, the task is retried when the
+    pause ends instead of holding the worker; it stays pending meanwhile, so a chord over it
+    waits for the page.
     """
+    staged = None
     try:
-        # Create scraper instance to check domain
-        scraper = Scraper(company_id, url)
+        # Reuse this worker's scraper context for the domain
+        scraper = Scraper.for_company(company_id, url)
 
         # Check if URL belongs to the same domain
         if not scraper._is_same_domain(url):
             logger.info(f"Skipping URL {url} as it's not part of the base domain")
-            return
+            return None
 
+        # Pages are fetched and staged under their canonical URL
+        url = scraper._resolve_urls([url])[url]
         logger.info(f"Scraping {url}")
 
-        # Check if the URL is already in the database
-        if Staging.objects.filter(url=url).exists():
-            logger.info(f"URL {url} already exists in the database")
-            return
+        # A page the company staged before is revalidated unless it is still current
+        staged = scraper._get_staged(url)
+        if staged and _is_recently_staged(staged):
+            logger.info(f"URL {url} was staged recently")
+            return None
 
         start_time = time.time()
-        results = scraper._scrape_content(url)
-
-        for url, content in results:
-            if content:
-                scraper._save_to_staging(url, content)
+        document = None
+        # A previously staged page is revalidated with a conditional request
+        response = scraper._fetch_content(url, staged)
+        if response is None:
+            logger.info(f"URL {url} not modified since last crawl")
+            scraper._refresh_staging(url)
+        elif response.status_code != 200:
+            logger.warning(f"Got status code {response.status_code} for {url}")
+        else:
+            # The page is staged under its rel=canonical link, so it is extracted here as well
+            page = None
+            if not scraper._is_document(url, response):
+                page = scraper._extract_page(
+                    response.content, url, response.headers.get("Content-Type", "")
+                )
+            canonical = scraper._canonical_url(url, response, page)
+            # PDFs come spooled to a temporary file, which is copied to the document store
+            spooled = getattr(response, "document", None)
+            try:
+                document = fetched_document(
+                    canonical,
+                    response.content if spooled is None else spooled,
+                    response.headers.get("Content-Type", ""),
+                    scraper._response_validators(response),
+                    # The staged copy looked up above is reused unless the page moved
+                    _staged_hash(staged) if canonical == url else None,
+                )
+            finally:
+                if spooled is not None:
+                    spooled.close()
 
         # Log ETA if we have progress information
         if total_urls is not None and current_index is not None:
@@ -50,8 +154,21 @@ def scrape_single_url(
 
             logger.info(f"Scraped {current_index}/{total_urls} - ETA: {eta_str} - URL: {url}")
 
+        return document
+
+    except HostUnavailable as e:
+        if self.request.retries >= self.max_retries:
+            kept = "its staged copy is kept" if staged else "it is not staged"
+            logger.error(
+                f"Giving up on {url} after {self.request.retries} deferrals, {kept}: {e}"
+            )
+            return None
+        logger.warning(f"Deferring {url} by {e.wait:.0f}s: {e}")
+        raise self.retry(countdown=e.wait)
+
     except Exception as e:
         logger.error(f"Error scraping {url}: {e}")
+    return None
 
 
 @shared_task(queue=settings.CELERY_QUEUE_SCRAPE, rate_limit=settings.CELERY_RATE_LIMIT_SCRAPE)
@@ -60,80 +177,138 @@ def process_link_batch(company_id: int, links: list) -> None:
     Processes a batch of links by scraping their content
     """
     for link in links:
-        scrape_single_url.delay(company_id, link)
+        scrape_and_parse(company_id, link).delay()
 
 
-@shared_task(queue=settings.CELERY_QUEUE_SCRAPE, rate_limit=settings.CELERY_RATE_LIMIT_SCRAPE)
-def crawl_domain(company_id: int, start_url: str) -> None:
-    """
-    Main task to crawl a domain. Returns list of all tasks created.
-    """
-    scraper = Scraper(company_id, start_url)
-    visited = set()
-    to_visit = {start_url}
-    total_links_extracted = 0
-    all_scraping_tasks = []
-
-    while to_visit and total_links_extracted < Scraper.MAX_LINKS:
-        # Calculate progress
-        progress = (total_links_extracted / Scraper.MAX_LINKS) * 100
-        remaining = Scraper.MAX_LINKS - total_links_extracted
-        logger.info(
-            f"Progress: {progress:.1f}% - Scraped: {total_links_extracted}, Remaining: {remaining}"
-        )
+@shared_task(
+    bind=True, queue=settings.CELERY_QUEUE_SCRAPE, rate_limit=settings.CELERY_RATE_LIMIT_SCRAPE
+)
+def crawl_domain(
+    self, company_id: int, start_url: str, shard: int = 0, queued: list = None
+) -> int:
+    """
+    Crawls one shard of the company's Redis crawl frontier on the asyncio crawl engine, until
+    the frontier is drained across all shards. start_crawl starts one task per shard. In
+    single-fetch mode the crawl responses go to the gd_parse workers to be staged, a batch at
+    a time, leaving out the pages that were staged recently; otherwise every claimed URL is
+    handed to scrape_single_url in batches. Once the crawl is done the task is replaced with
+    wait_for_parsing, so a chord over the crawl tasks completes only when the pages are
+    staged. Returns the number of pages fetched.
 
-        # Collect links from current batch of URLs
-        current_batch_tasks = []
-        for i, url in enumerate(to_visit):
-            # Ensure URL is not already in visited
-            if url not in visited:
-                current_batch_tasks.append(
-                    scrape_single_url.s(
-                        company_id,
-                        url,
-                        total_urls=Scraper.MAX_LINKS,
-                        current_index=total_links_extracted + i,
-                    )
-                )
+    A crawl that runs up to its soft time limit stops claiming URLs shortly before it, hands
+    its unfinished URLs back to the frontier and is replaced with a new task for the shard,
+    which resumes from the frontier. queued carries over the parse tasks of the earlier runs.
+    """
+    # The engine stops claiming URLs in time to finish the pages in hand before the soft limit
+    deadline = (
+        time.monotonic() + settings.CELERY_TASK_SOFT_TIME_LIMIT - settings.CRAWL_TASK_STOP_MARGIN
+    )
+    scraper = Scraper.for_company(company_id, start_url)
+    frontier = CrawlFrontier(company_id)
 
-        # Add current batch tasks to overall task list
-        all_scraping_tasks.extend(current_batch_tasks)
+    # Called on its own rather than through start_crawl: seed (or resume) the frontier here
+    if not frontier.stats():
+        frontier.start(start_url, Scraper.MAX_LINKS)
 
-        # Execute current batch and get new links
-        group(current_batch_tasks).apply_async()
-        new_links = set()
+    # Final tasks of the parse work queued by this crawl
+    queued = list(queued or [])
 
-        for url in to_visit:
-            try:
-                # Add delay between requests
-                time.sleep(random.uniform(2, 5))  # Increased delay
-
-                response = scraper._make_request(url)
-                if response.status_code == 200:
-                    # Extract links from the response
-                    extracted_links = scraper._extract_links(response.content, url)
-                    if not extracted_links:
-                        logger.warning(f"No links extracted from {url}")
-                    normalized_links = {scraper._normalize_url(link) for link in extracted_links}
-                    new_links.update(normalized_links)
-                else:
-                    logger.warning(f"Got status code {response.status_code} for {url}")
-            except Exception as e:
-                logger.error(f"Error getting links from {url}: {e}")
+    def dispatch(urls: list, offset: int) -> None:
+        recently_staged = _recently_staged_urls(company_id, urls)
+        if recently_staged:
+            logger.info(f"Skipping {len(recently_staged)} pages that were staged recently")
+            urls = [url for url in urls if url not in recently_staged]
+        if not urls:
+            return
+        result = group(
+            scrape_and_parse(
+                company_id,
+                url,
+                total_urls=Scraper.MAX_LINKS,
+                current_index=offset + i,
+            )
+            for i, url in enumerate(urls)
+        ).apply_async()
+        queued.extend(chain_result.id for chain_result in result.results)
+
+    # Fetched pages wait here so their staged copies are looked up a batch at a time. The
+    # engine calls stage_page from its thread pool.
+    fetched_pages = []
+    fetched_pages_lock = threading.Lock()
+
+    def stage_pages(pages: list) -> None:
+        staged = _staged_copies(company_id, [url for url, *_ in pages])
+        recent = 0
+        for url, content, content_type, validators in pages:
+            copy = staged.get(url)
+            if copy and _is_recently_staged(copy):
+                recent += 1
                 continue
+            queued.append(
+                queue_parse(
+                    company_id, url, content, content_type, validators, _staged_hash(copy)
+                )
+            )
+        if recent:
+            logger.info(f"Skipping {recent} pages that were staged recently")
 
-        visited.update(to_visit)
-        # Remove already visited URLs and ensure uniqueness
-        new_links = new_links - visited
+    def stage_page(url: str, content: bytes, content_type: str, validators: dict) -> None:
+        with fetched_pages_lock:
+            fetched_pages.append((url, content, content_type, validators))
+            if len(fetched_pages) < settings.CRAWL_DISPATCH_BATCH_SIZE:
+                return
+            pages = fetched_pages[:]
+            fetched_pages.clear()
+        stage_pages(pages)
 
-        if total_links_extracted + len(new_links) > Scraper.MAX_LINKS:
-            new_links = set(list(new_links)[: Scraper.MAX_LINKS - total_links_extracted])
+    on_content = stage_page if settings.CRAWL_SINGLE_FETCH else None
+    scorer = RelevanceScorer.from_glossary()
+    crawler = AsyncCrawler(
+        scraper,
+        frontier,
+        shard,
+        dispatch,
+        on_content=on_content,
+        scorer=scorer,
+        deadline=deadline,
+    )
+    try:
+        fetched = crawler.crawl()
+    except SoftTimeLimitExceeded:
+        # Cut off anyway: put the URLs it still held back on the frontier for the next task
+        crawler.release()
+        fetched = crawler.fetched
+    if fetched_pages:
+        stage_pages(fetched_pages)
 
-        to_visit = new_links
-        total_links_extracted += len(new_links)
-        logger.info(
-            f"Visited: {len(visited)}, To visit: {len(to_visit)}, Total links extracted: {total_links_extracted}"
-        )
+    if crawler.interrupted:
+        logger.info(f"Crawl shard {shard} fetched {fetched} pages, continuing in a new task")
+        return self.replace(crawl_domain.si(company_id, start_url, shard, queued))
+
+    if queued:
+        logger.info(f"Crawl shard {shard} fetched {fetched} pages, waiting for them to be staged")
+        return self.replace(wait_for_parsing.si(queued))
+    return fetched
+
+
+@shared_task(queue=settings.CELERY_QUEUE_SCRAPE, rate_limit=settings.CELERY_RATE_LIMIT_SCRAPE)
+def start_crawl(company_id: int, domain: str, report_uuid: str) -> None:
+    """
+    Seeds the company's crawl frontier from the domain's sitemaps, then crawls it with one
+    crawl_domain task per shard, in a chord that runs process_after_scraping once every page
+    is staged. An unfinished crawl of the same domain is resumed instead of starting over.
+    Sitemap discovery runs here rather than in start_detective, so a site with a large sitemap
+    does not hold up the gd_general workers.
+    """
+    from detective.tasks.general import process_after_scraping
+    from detective.tasks.helpers import seed_crawl_frontier
+
+    try:
+        frontier = seed_crawl_frontier(company_id, domain)
+    except Exception as e:
+        # The crawl still starts from the domain and follows its links
+        logger.error(f"Error seeding crawl of {domain} from its sitemaps: {e}")
+        frontier = CrawlFrontier(company_id)
 
-    # Return all tasks that were created
-    return all_scraping_tasks
+    crawl_tasks = [crawl_domain.s(company_id, domain, shard) for shard in range(frontier.shards)]
+    chord(crawl_tasks)(process_after_scraping.si(company_id, report_uuid))
@@ -0,0 +1,3 @@
+from detective.utils.crawl.engine import AsyncCrawler
+from detective.utils.crawl.frontier import CrawlFrontier
+from detective.utils.crawl.relevance import RelevanceScorer
@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import re
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE_PATTERN = re.compile(r"[\W_]+")
+
+# Counts a page's blocks towards its site's block frequencies and returns which of them are
+# boilerplate. Each page is counted once, and only the first learn-limit pages of a site are
+# counted; later pages are only looked up, which keeps the hash to a few thousand fields.
+# A block is boilerplate once it appears on at least min pages, and on at least min ratio of
+# the pages learned.
+# KEYS[1] = block counts hash, KEYS[2] = learned pages set
+# ARGV = page, learn limit, min pages, min ratio, ttl, block hashes...
+LEARN_SCRIPT = """
+local pages = redis.call('SCARD', KEYS[2])
+if pages < tonumber(ARGV[2]) and redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    pages = pages + 1
+    for i = 6, #ARGV do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], 1)
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+
+local threshold = math.max(tonumber(ARGV[3]), tonumber(ARGV[4]) * pages)
+local boilerplate = {}
+for i = 6, #ARGV do
+    local count = tonumber(redis.call('HGET', KEYS[1], ARGV[i])) or 0
+    if count >= threshold then
+        table.insert(boilerplate, ARGV[i])
+    end
+end
+return boilerplate
+"""
+
+
+def block_hash(block: str) -> str:
+    """Hash of a text block, ignoring case, punctuation and spacing"""
+    normalized = NORMALIZE_PATTERN.sub(" ", block.lower()).strip()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class BoilerplateFilter:
+    """
+    Learns a site's repeated text blocks across its pages and strips them from page text.
+
+    Navigation, footers, cookie banners and menus come back as the same blocks on every page.
+    Block frequencies are kept in Redis, so every worker crawling the site learns from the
+    same pages. The stats outlive a crawl, so re-crawls strip boilerplate from their first
+    page and the staged text of an unchanged page keeps its content hash.
+    """
+
+    KEY_PREFIX = "gd:boilerplate"
+
+    def __init__(self, domain: str, redis=None) -> None:
+        self.redis = redis or settings.REDIS_CONN
+        site = domain.lower().removeprefix("www.")
+        self.counts_key = f"{self.KEY_PREFIX}:{site}:blocks"
+        self.pages_key = f"{self.KEY_PREFIX}:{site}:pages"
+        self.enabled = settings.BOILERPLATE_FILTER
+        self.learn_pages = settings.BOILERPLATE_LEARN_PAGES
+        self.min_pages = settings.BOILERPLATE_MIN_PAGES
+        self.min_ratio = settings.BOILERPLATE_MIN_RATIO
+        self.ttl = settings.BOILERPLATE_TTL
+
+        self._learn_script = self.redis.register_script(LEARN_SCRIPT)
+
+    def strip(self, url: str, blocks: list) -> str:
+        """
+        Learns from a page's blocks and returns its text without the site's boilerplate
+        """
+        if not self.enabled or not blocks:
+            return " ".join(blocks)
+
+        hashes = [block_hash(block) for block in blocks]
+        boilerplate = set(
+            self._learn_script(
+                keys=[self.counts_key, self.pages_key],
+                args=[
+                    hashlib.blake2b(url.encode("utf-8"), digest_size=8).hexdigest(),
+                    self.learn_pages,
+                    self.min_pages,
+                    self.min_ratio,
+                    self.ttl,
+                    *set(hashes),
+                ],
+            )
+        )
+        if not boilerplate:
+            return " ".join(blocks)
+
+        kept = [block for block, digest in zip(blocks, hashes) if digest not in boilerplate]
+        logger.debug(f"Stripped {len(blocks) - len(kept)} of {len(blocks)} blocks from {url}")
+        return " ".join(kept)
@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import undetected_chromedriver as uc
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolExhausted(Exception):
+    pass
+
+
+def _process_tree_rss_mb(pid) -> float:
+    """
+    Resident memory of a process and all of its descendants, read from /proc.
+    Returns 0 where /proc is unavailable.
+    """
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class PooledBrowser:
+    """
+    A warm headless Chrome instance and its usage counters
+    """
+
+    def __init__(self, driver) -> None:
+        self.driver = driver
+        self.pages = 0
+        self.started_at = time.time()
+        self.idle_since = time.monotonic()
+
+    def memory_mb(self) -> float:
+        pid = getattr(self.driver, "browser_pid", None)
+        return _process_tree_rss_mb(pid) if pid else 0
+
+    def reset(self) -> None:
+        """
+        Leaves a single blank tab for the next page, keeping cookies so solved challenges
+        carry over.
+        """
+        handles = self.driver.window_handles
+        for handle in handles[1:]:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        self.driver.get("about:blank")
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.error(f"Error while quitting driver: {e}")
+
+
+class BrowserPool:
+    """
+    Per-worker-process pool of warm headless Chrome instances.
+
+    Browsers are started lazily up to `size` and handed out one page at a time. Each one is
+    reused across pages and recycled once it has served `max_pages` pages or its process
+    tree exceeds `max_memory_mb`, so a page render costs a navigation instead of a browser
+    launch. A browser left unused for `idle_timeout` seconds is shut down, so a worker that
+    stopped rendering pages does not keep Chrome running.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_pages: int,
+        max_memory_mb: int,
+        acquire_timeout: float,
+        idle_timeout: float = 0,
+    ) -> None:
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        # Used as a stack: the most recently used, warmest browser stays in rotation
+        self._idle = []
+        # Notified whenever a browser is returned or a slot to start one frees up
+        self._available = threading.Condition()
+        self._started = 0
+        self._reaper = None
+        self._stopped = threading.Event()
+
+    @contextmanager
+    def browser(self):
+        """
+        Lends a browser driver for one page.
+        """
+        browser = self._acquire()
+        healthy = False
+        try:
+            yield browser.driver
+            healthy = True
+        finally:
+            self._release(browser, healthy)
+
+    def _acquire(self) -> PooledBrowser:
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._available:
+            while not self._idle and self._started >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BrowserPoolExhausted(
+                        f"No browser available after {self.acquire_timeout}s "
+                        f"(pool size {self.size})"
+                    )
+                self._available.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+
+        try:
+            browser = PooledBrowser(self._launch())
+        except Exception:
+            self._free_slot()
+            raise
+        self._start_reaper()
+        return browser
+
+    def _release(self, browser: PooledBrowser, healthy: bool) -> None:
+        browser.pages += 1
+
+        if not healthy:
+            self._retire(browser, "page failed")
+        elif browser.pages >= self.max_pages:
+            self._retire(browser, f"served {browser.pages} pages")
+        elif self.max_memory_mb and browser.memory_mb() > self.max_memory_mb:
+            self._retire(browser, f"memory above {self.max_memory_mb}MB")
+        else:
+            try:
+                browser.reset()
+            except Exception as e:
+                self._retire(browser, f"reset failed: {e}")
+                return
+            browser.idle_since = time.monotonic()
+            with self._available:
+                self._idle.append(browser)
+                self._available.notify()
+
+    def _retire(self, browser: PooledBrowser, reason: str) -> None:
+        logger.info(f"Recycling browser ({reason})")
+        browser.quit()
+        self._free_slot()
+
+    def _free_slot(self) -> None:
+        # A waiter can start a browser in the freed slot
+        with self._available:
+            self._started -= 1
+            self._available.notify()
+
+    def _start_reaper(self) -> None:
+        with self._available:
+            if not self.idle_timeout or self._reaper is not None:
+                return
+            self._reaper = threading.Thread(
+                target=self._reap_idle, name="browser-pool-reaper", daemon=True
+            )
+        self._reaper.start()
+
+    def _reap_idle(self) -> None:
+        """
+        Shuts down browsers left idle for idle_timeout seconds, until the pool is shut down
+        """
+        while not self._stopped.wait(min(self.idle_timeout, 60)):
+            now = time.monotonic()
+            with self._available:
+                expired = [b for b in self._idle if now - b.idle_since >= self.idle_timeout]
+                self._idle = [b for b in self._idle if b not in expired]
+            for browser in expired:
+                self._retire(browser, f"idle for {self.idle_timeout:.0f}s")
+
+    def _launch(self):
+        options = uc.ChromeOptions()
+        options.add_argument("--headless")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--disable-blink-features=AutomationControlled")
+
+        driver = uc.Chrome(options=options)
+        # Set page load timeout
+        driver.set_page_load_timeout(30)
+        return driver
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        with self._available:
+            idle, self._idle = self._idle, []
+        for browser in idle:
+            self._retire(browser, "shutdown")
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Returns this process's browser pool, creating it on first use. A forked child never
+    inherits its parent's browsers.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = BrowserPool(
+                size=settings.BROWSER_POOL_SIZE,
+                max_pages=settings.BROWSER_POOL_MAX_PAGES,
+                max_memory_mb=settings.BROWSER_POOL_MAX_MEMORY_MB,
+                acquire_timeout=settings.BROWSER_POOL_ACQUIRE_TIMEOUT,
+                idle_timeout=settings.BROWSER_POOL_IDLE_TIMEOUT,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@worker_process_shutdown.connect
+def shutdown_browser_pool(**kwargs) -> None:
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown()
@@ -0,0 +1,80 @@
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# A method's score is capped, so a long run of successes is outweighed by a few failures
+MAX_SCORE = 3
+
+# Decays a method's score for a host by its half-life, then adds the outcome (+1 or -1).
+# KEYS[1] = host hash
+# ARGV = now, method, outcome, half-life, max score, ttl
+RECORD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local state = redis.call('HMGET', KEYS[1], ARGV[2], ARGV[2] .. ':at')
+local score = tonumber(state[1]) or 0
+local recorded_at = tonumber(state[2]) or now
+local max_score = tonumber(ARGV[5])
+
+score = score * 0.5 ^ ((now - recorded_at) / tonumber(ARGV[4])) + tonumber(ARGV[3])
+score = math.max(-max_score, math.min(max_score, score))
+redis.call('HSET', KEYS[1], ARGV[2], score, ARGV[2] .. ':at', now)
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+return tostring(score)
+"""
+
+
+class BypassMemory:
+    """
+    Remembers which fetch methods get through to each host, shared by every worker.
+
+    Each method keeps a score per host that goes up when it gets a page and down when it is
+    blocked or fails, and decays towards zero with a half-life of BYPASS_MEMORY_HALF_LIFE.
+    Methods are tried best score first, so on a Cloudflare-protected host requests go straight
+    to the method that has been getting through, and methods that have been failing are tried
+    last. Once the remembered method starts failing, or its successes decay, the cheaper methods
+    are tried again, so a host that drops its protection is noticed.
+    """
+
+    KEY_PREFIX = "gd:bypass"
+
+    def __init__(self, redis=None) -> None:
+        self.redis = redis or settings.REDIS_CONN
+        self.half_life = settings.BYPASS_MEMORY_HALF_LIFE
+        self.ttl = settings.BYPASS_MEMORY_TTL
+
+        self._record_script = self.redis.register_script(RECORD_SCRIPT)
+
+    def _key(self, host: str) -> str:
+        return f"{self.KEY_PREFIX}:{host.lower()}"
+
+    def scores(self, host: str) -> dict:
+        """
+        Current (decayed) score of each method recorded for the host
+        """
+        state = self.redis.hgetall(self._key(host))
+        now = time.time()
+        scores = {}
+        for field, score in state.items():
+            if field.endswith(":at"):
+                continue
+            age = now - float(state.get(f"{field}:at", now))
+            scores[field] = float(score) * 0.5 ** (age / self.half_life)
+        return scores
+
+    def order(self, host: str, methods: list) -> list:
+        """
+        The methods in the order to try them on the host, best score first. Methods without a
+        score there, or with equal scores, keep their given order.
+        """
+        scores = self.scores(host)
+        return sorted(methods, key=lambda method: -scores.get(method, 0))
+
+    def record(self, host: str, method: str, success: bool) -> None:
+        score = self._record_script(
+            keys=[self._key(host)],
+            args=[time.time(), method, 1 if success else -1, self.half_life, MAX_SCORE, self.ttl],
+        )
+        logger.debug(f"{method} {'got through to' if success else 'failed on'} {host} ({score})")
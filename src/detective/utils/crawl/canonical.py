@@ -0,0 +1,99 @@
+import fnmatch
+import re
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+from django.conf import settings
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Session ids some servers append to the path, e.g. /about;jsessionid=0A1B2C
+PATH_SESSION_PATTERN = re.compile(r";(?:jsessionid|phpsessid|sid)=[^/]*", re.I)
+
+
+def strip_rules(value: str = None) -> tuple:
+    """
+    Query parameter patterns from a comma-separated list, e.g. "utm_*,gclid,sessionid"
+    """
+    if value is None:
+        value = settings.CANONICAL_STRIP_PARAMS
+    return tuple(rule.strip().lower() for rule in value.split(",") if rule.strip())
+
+
+def _is_stripped(pair: str, rules: tuple) -> bool:
+    name = unquote_plus(pair.split("=", 1)[0]).lower()
+    return any(fnmatch.fnmatchcase(name, rule) for rule in rules)
+
+
+def canonicalize_url(url: str, rules: tuple = None) -> str:
+    """
+    Canonical form of a URL, so that spellings of the same address crawl and stage once.
+
+    The scheme and host are lowercased and a default port dropped, and the fragment, path
+    session ids and trailing slash removed. Query parameters matching the strip rules
+    (tracking and session parameters) are dropped and the rest sorted, keeping their original
+    encoding. Paths are case sensitive on most servers, so they are only lowercased when
+    CANONICAL_LOWERCASE_PATHS is set.
+    """
+    rules = strip_rules() if rules is None else rules
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    userinfo, at, _ = parts.netloc.rpartition("@")
+    if at:
+        netloc = f"{userinfo}@{netloc}"
+
+    path = PATH_SESSION_PATTERN.sub("", parts.path).rstrip("/")
+    if settings.CANONICAL_LOWERCASE_PATHS:
+        path = path.lower()
+
+    query = sorted(
+        pair for pair in parts.query.split("&") if pair and not _is_stripped(pair, rules)
+    )
+    return urlunsplit((scheme, netloc, path, "&".join(query), ""))
+
+
+class CanonicalUrls:
+    """
+    A company's known URL aliases in Redis.
+
+    A URL that redirects to another page of the site, or declares another URL with
+    <link rel="canonical">, is an alias of that URL. Links to an alias resolve to its canonical
+    URL before they reach the crawl frontier, so the page is fetched and staged once. Aliases
+    are shared by every worker and kept for CANONICAL_ALIAS_TTL, so re-crawls start out
+    knowing them.
+    """
+
+    KEY_PREFIX = "gd:canonical"
+
+    def __init__(self, company_id, redis=None) -> None:
+        self.redis = redis or settings.REDIS_CONN
+        self.key = f"{self.KEY_PREFIX}:{company_id}"
+        self.ttl = settings.CANONICAL_ALIAS_TTL
+
+    def resolve(self, urls) -> dict:
+        """
+        Maps each URL to its canonical URL, or to itself if it is not a known alias
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        canonical = self.redis.hmget(self.key, urls)
+        return {url: target or url for url, target in zip(urls, canonical)}
+
+    def record(self, alias: str, canonical: str) -> None:
+        # Point at the end of a known chain, so lookups never need more than one hop
+        canonical = self.resolve([canonical])[canonical]
+        if alias == canonical:
+            return
+        pipe = self.redis.pipeline()
+        pipe.hset(self.key, alias, canonical)
+        pipe.expire(self.key, self.ttl)
+        pipe.execute()
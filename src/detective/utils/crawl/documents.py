@@ -0,0 +1,106 @@
+import io
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+FILES_DIR = "files"
+
+
+class RawDocumentStore:
+    """
+    Hands fetched response bodies from the scrape workers to the gd_parse workers, so only a
+    key travels through the broker. Pages go through Redis. PDFs are saved as files in
+    PARSE_DOCUMENT_BACKEND storage instead, so a large report is copied from disk to disk and
+    never held in Redis. A document is read once and expires after PARSE_DOCUMENT_TTL if no
+    parse worker picks it up; expired files are removed by the evict_parse_documents task.
+    """
+
+    KEY_PREFIX = "gd:document"
+    FILE_KEY_PREFIX = "file:"
+
+    def __init__(self, redis=None, storage=None) -> None:
+        self.redis = redis or settings.REDIS_BINARY_CONN
+        self.ttl = settings.PARSE_DOCUMENT_TTL
+        self.storage = storage or self._storage()
+
+    def _storage(self):
+        if settings.PARSE_DOCUMENT_BACKEND == "disk":
+            return FileSystemStorage(location=settings.PARSE_DOCUMENT_DIR)
+        if settings.PARSE_DOCUMENT_BACKEND == "s3":
+            from custom_storages import ParseDocumentStorage
+
+            return ParseDocumentStorage()
+        return None
+
+    def put(self, document) -> str:
+        """
+        Stores a fetched document, given as bytes or as a binary file such as the spooled body
+        of a PDF. Returns its key.
+        """
+        if isinstance(document, bytes):
+            if self.storage is None or document[:5] != b"%PDF-":
+                key = f"{self.KEY_PREFIX}:{uuid.uuid4().hex}"
+                self.redis.set(key, document, ex=self.ttl)
+                return key
+            document = io.BytesIO(document)
+
+        if self.storage is None:
+            return self.put(document.read())
+        name = self.storage.save(f"{FILES_DIR}/{uuid.uuid4().hex}", File(document))
+        return f"{self.FILE_KEY_PREFIX}{name}"
+
+    @contextmanager
+    def take(self, key: str):
+        """
+        Yields the stored document as a binary file, or None if it has expired, and removes it
+        """
+        if not key.startswith(self.FILE_KEY_PREFIX):
+            pipe = self.redis.pipeline()
+            pipe.get(key)
+            pipe.delete(key)
+            content, _ = pipe.execute()
+            yield None if content is None else io.BytesIO(content)
+            return
+
+        name = key[len(self.FILE_KEY_PREFIX) :]
+        try:
+            document = self.storage.open(name, "rb")
+        except FileNotFoundError:
+            yield None
+            return
+        try:
+            with document:
+                yield document
+        finally:
+            self.storage.delete(name)
+
+    def evict(self) -> int:
+        """
+        Removes files that were not parsed within PARSE_DOCUMENT_TTL. Returns how many.
+        """
+        if self.storage is None:
+            return 0
+        try:
+            _, names = self.storage.listdir(FILES_DIR)
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        for name in names:
+            path = f"{FILES_DIR}/{name}"
+            try:
+                modified = self.storage.get_modified_time(path)
+            except FileNotFoundError:
+                continue
+            if time.time() - modified.timestamp() > self.ttl:
+                self.storage.delete(path)
+                removed += 1
+        logger.info(f"Removed {removed} fetched documents that were never parsed")
+        return removed
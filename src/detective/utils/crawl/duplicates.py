@@ -0,0 +1,108 @@
+import hashlib
+import re
+from collections import Counter
+
+from django.conf import settings
+
+WORD_PATTERN = re.compile(r"\w+")
+
+FINGERPRINT_BITS = 64
+# Fingerprints are indexed in 8 bands of 8 bits. Two fingerprints within 7 bits of each other
+# agree exactly on at least one band, so the bands find every candidate up to a distance of 7.
+# A 1% edit to a page moves its fingerprint by about 5 bits; unrelated pages are 20 or more apart.
+BANDS = 8
+BAND_BITS = FINGERPRINT_BITS // BANDS
+SHINGLE_SIZE = 3
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of a text from its word 3-shingles. Texts that share most of their shingles
+    get fingerprints that differ in only a few bits.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    shingles = Counter(
+        " ".join(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)
+    )
+
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in shingles.items():
+        digest = int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if digest >> bit & 1 else -count
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class DuplicateIndex:
+    """
+    Per-company SimHash index of staged page text in Redis.
+
+    Query-string variants, paginated listings and localized copies of a page differ in only
+    a few words, so their fingerprints land within DEDUP_MAX_DISTANCE bits of each other.
+    Each indexed fingerprint points at the Staging row of the page it was first seen on.
+    """
+
+    KEY_PREFIX = "gd:dedup"
+
+    def __init__(self, company_id, redis=None) -> None:
+        self.redis = redis or settings.REDIS_CONN
+        self.prefix = f"{self.KEY_PREFIX}:{company_id}"
+        self.pages_key = f"{self.prefix}:pages"
+        self.enabled = settings.DEDUP_NEAR_DUPLICATES
+        self.max_distance = min(settings.DEDUP_MAX_DISTANCE, BANDS - 1)
+        self.min_words = settings.DEDUP_MIN_WORDS
+        self.ttl = settings.DEDUP_INDEX_TTL
+
+    def _band_keys(self, fingerprint: int) -> list:
+        mask = (1 << BAND_BITS) - 1
+        return [
+            f"{self.prefix}:band:{band}:{fingerprint >> (band * BAND_BITS) & mask:x}"
+            for band in range(BANDS)
+        ]
+
+    def fingerprint(self, text: str):
+        """
+        The text's fingerprint, or None if dedup is off or the text is too short to compare
+        """
+        if not self.enabled or len(WORD_PATTERN.findall(text)) < self.min_words:
+            return None
+        return simhash(text)
+
+    def find(self, fingerprint: int) -> list:
+        """
+        Staging uuids of the indexed pages within max_distance of the fingerprint, closest
+        first
+        """
+        pipe = self.redis.pipeline()
+        for key in self._band_keys(fingerprint):
+            pipe.smembers(key)
+        candidates = set().union(*pipe.execute())
+
+        matches = []
+        for candidate in candidates:
+            distance = hamming_distance(fingerprint, int(candidate, 16))
+            if distance <= self.max_distance:
+                matches.append((distance, candidate))
+        if not matches:
+            return []
+
+        matches.sort()
+        staging_uuids = self.redis.hmget(self.pages_key, [candidate for _, candidate in matches])
+        return [staging_uuid for staging_uuid in staging_uuids if staging_uuid]
+
+    def add(self, fingerprint: int, staging_uuid) -> None:
+        member = f"{fingerprint:x}"
+        pipe = self.redis.pipeline()
+        for key in self._band_keys(fingerprint):
+            pipe.sadd(key, member)
+            pipe.expire(key, self.ttl)
+        pipe.hset(self.pages_key, member, str(staging_uuid))
+        pipe.expire(self.pages_key, self.ttl)
+        pipe.execute()
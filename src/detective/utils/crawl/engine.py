@@ -0,0 +1,409 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import httpx
+from django.conf import settings
+
+from detective.utils.crawl.fetch_cache import FetchCacheMiss
+from detective.utils.crawl.host_limiter import HostRateLimiter, HostUnavailable
+from detective.utils.crawl.http_client import ResponseTooLarge, aread_limited, crawl_transport
+from detective.utils.crawl.relevance import RelevanceScorer
+from detective.utils.crawl.visited import ScalableBloomFilter
+from detective.utils.crawl.warc import WarcRecorder
+
+logger = logging.getLogger(__name__)
+
+CHALLENGE_MARKERS = ("Verifying your connection", "Security check")
+
+# Status codes worth retrying through the Scraper's bypass chain (Cloudflare, WAFs, throttling)
+FALLBACK_STATUS_CODES = {403, 429, 503}
+
+
+class HostSlots:
+    """
+    Per-host politeness: caps the number of in-flight requests to a host and paces request
+    starts with the host's adaptive rate limit, which is shared with every other worker.
+    """
+
+    def __init__(self, per_host: int, limiter: HostRateLimiter) -> None:
+        self.per_host = per_host
+        self.limiter = limiter
+        self._semaphores = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        async with self._semaphores[host]:
+            await self.limiter.acquire_async(host)
+            yield
+
+
+class AsyncCrawler:
+    """
+    Asyncio crawl engine for link discovery on a domain.
+
+    The engine works one shard of a shared CrawlFrontier, so several crawl tasks can expand
+    the same domain in parallel, and steals from other shards once its own runs dry. Pages are
+    fetched with a bounded number of concurrent requests over a shared keep-alive client, and
+    each host gets its own politeness slots, paced by its adaptive rate limit. Pages that are
+    blocked or challenged fall back to the Scraper's bypass chain in a worker thread.
+
+    Only the HTTP requests run on the event loop. Parsing, the callbacks and the (synchronous)
+    Redis calls of the frontier, rate limiter and canonical URLs run in a thread pool, so they
+    overlap with the requests in flight instead of holding up the loop.
+
+    Claimed URLs are handed to `dispatch` in batches. In single-fetch mode (`on_content`
+    given), nothing is dispatched: each response body goes to `on_content` with its content
+    type and validators, to be parsed and staged off the crawl worker. Only the links of HTML
+    pages are extracted here.
+
+    Links and pages are resolved to their canonical URLs: a page that redirected or declares
+    rel=canonical is staged under that URL, and links to known aliases are not queued again.
+
+    Discovered links are scored by `scorer` from their path and anchor text, so the frontier
+    hands out the most relevant pages first.
+
+    With CRAWL_WARC_DIR set, the responses of the crawl are recorded to a WARC file there, to be
+    served by the crawl fixture server for offline benchmarks.
+
+    Given a `deadline` (a time.monotonic() value), the engine stops claiming URLs once it
+    passes, finishes the pages it holds and returns with `interrupted` set, leaving the rest
+    of the frontier to another crawl. An engine cut off mid-crawl hands its claimed URLs back
+    with release().
+    """
+
+    def __init__(
+        self,
+        scraper,
+        frontier,
+        shard: int = 0,
+        dispatch=None,
+        on_content=None,
+        scorer=None,
+        deadline: float = None,
+    ) -> None:
+        self.scraper = scraper
+        self.scorer = scorer or RelevanceScorer()
+        self.frontier = frontier
+        self.shard = shard
+        self.dispatch = dispatch
+        self.on_content = on_content
+        self.single_fetch = on_content is not None
+        self.concurrency = settings.CRAWL_CONCURRENCY
+        self.host_concurrency = settings.CRAWL_HOST_CONCURRENCY
+        self.fallback_concurrency = settings.CRAWL_FALLBACK_CONCURRENCY
+        self.dispatch_batch_size = settings.CRAWL_DISPATCH_BATCH_SIZE
+        self.request_timeout = settings.CRAWL_REQUEST_TIMEOUT
+        self.poll_interval = settings.CRAWL_FRONTIER_POLL_INTERVAL
+        self.deadline = deadline
+        self.interrupted = False
+        # URLs claimed from the frontier that are not fetched yet
+        self.leased = set()
+        self.completed = []
+
+    def crawl(self) -> int:
+        """
+        Crawls this engine's shard until the whole frontier is drained.
+        Returns the number of pages fetched by this engine.
+        """
+        return asyncio.run(self._crawl())
+
+    async def _crawl(self) -> int:
+        self.queue = asyncio.Queue(maxsize=self.concurrency)
+        self.pending_dispatch = []
+        # URLs this engine already offered to the frontier; most links on a page repeat the
+        # site navigation, so this keeps them off Redis without holding URL strings in memory
+        self.submitted = ScalableBloomFilter(error_rate=settings.CRAWL_VISITED_ERROR_RATE)
+        self.submitted_lock = threading.Lock()
+        self.fetched = 0
+        self.started_at = time.monotonic()
+        self.limiter = HostRateLimiter()
+        self.slots = HostSlots(self.host_concurrency, self.limiter)
+        self.fallback_slots = asyncio.Semaphore(self.fallback_concurrency)
+        self.recorder = None
+        if settings.CRAWL_WARC_DIR:
+            self.recorder = WarcRecorder.for_crawl(
+                settings.CRAWL_WARC_DIR, self.scraper.start_url
+            )
+
+        # Room for every worker's page processing and the fallback fetches at the same time
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=self.concurrency + self.fallback_concurrency + 2,
+                thread_name_prefix="crawl",
+            )
+        )
+
+        # HTTP/2 multiplexes a host's requests over one connection
+        async with httpx.AsyncClient(
+            headers=self.scraper.headers,
+            timeout=self.request_timeout,
+            follow_redirects=True,
+            transport=crawl_transport(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            ),
+        ) as client:
+            self.client = client
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            try:
+                await self._feed()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                await self._flush_completed()
+                await self._flush_dispatch()
+                if self.recorder is not None:
+                    self.recorder.close()
+
+        if self.interrupted:
+            logger.info(
+                f"Crawl shard {self.shard} stopped at its deadline - Fetched: {self.fetched}, "
+                f"Elapsed: {time.monotonic() - self.started_at:.0f}s"
+            )
+            return self.fetched
+
+        await asyncio.to_thread(self.frontier.finish)
+        stats = await asyncio.to_thread(self.frontier.stats)
+        logger.info(
+            f"Crawl shard {self.shard} finished - Fetched: {self.fetched}, "
+            f"Elapsed: {time.monotonic() - self.started_at:.0f}s, "
+            f"Frontier: {stats}"
+        )
+        return self.fetched
+
+    async def _feed(self) -> None:
+        """
+        Moves URLs from this shard of the frontier to the local workers until the frontier is
+        drained across all shards.
+        """
+        while True:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                # Finish the pages in hand and leave the rest of the frontier to the next task
+                await self.queue.join()
+                self.interrupted = True
+                return
+
+            urls = await asyncio.to_thread(self._claim)
+            if urls:
+                self.leased.update(urls)
+                if not self.single_fetch:
+                    for url in urls:
+                        await self._add_to_dispatch(url)
+                for url in urls:
+                    await self.queue.put(url)
+                continue
+
+            # Local work can still add URLs to this shard, so let it finish before deciding
+            await self.queue.join()
+            await self._flush_completed()
+            await self._flush_dispatch()
+            if await asyncio.to_thread(self.frontier.is_drained):
+                return
+
+            # Other shards are still busy; pick up whatever they send us or leave behind
+            await asyncio.sleep(self.poll_interval)
+            await asyncio.to_thread(self.frontier.requeue_expired)
+
+    def _claim(self) -> list:
+        # Prefer this engine's shard but take over idle shards' work, so a shard task that is
+        # queued behind the worker's concurrency limit (or dead) cannot stall the crawl
+        for offset in range(self.frontier.shards):
+            shard = (self.shard + offset) % self.frontier.shards
+            urls = self.frontier.claim(shard, self.concurrency)
+            if urls:
+                return urls
+        return []
+
+    async def _add_to_dispatch(self, url: str) -> None:
+        self.pending_dispatch.append(url)
+        if len(self.pending_dispatch) >= self.dispatch_batch_size:
+            await self._flush_dispatch()
+
+    async def _flush_dispatch(self) -> None:
+        if not self.pending_dispatch or self.dispatch is None:
+            return
+
+        # The batch is taken on the event loop, so no URL is added to it while it is sent
+        urls, self.pending_dispatch = self.pending_dispatch, []
+        await asyncio.to_thread(self._dispatch, urls)
+
+    def _dispatch(self, urls: list) -> None:
+        offset = self.frontier.mark_dispatched(len(urls))
+        self.dispatch(urls, offset)
+
+    async def _flush_completed(self) -> None:
+        if not self.completed:
+            return
+
+        urls, self.completed = self.completed, []
+        await asyncio.to_thread(self._complete, urls)
+
+    def _complete(self, urls: list) -> None:
+        self.frontier.complete(urls)
+        self.frontier.checkpoint()
+
+    def release(self) -> None:
+        """
+        After the crawl was cut off, records the pages it fetched and puts the URLs it still
+        held back on the frontier, instead of leaving them leased until the leases expire
+        """
+        urls, self.completed = self.completed, []
+        if urls:
+            self._complete(urls)
+        released = self.frontier.release(list(self.leased))
+        self.leased.clear()
+        self.interrupted = True
+        logger.info(f"Crawl shard {self.shard} cut off, released {released} claimed URLs")
+
+    async def _worker(self) -> None:
+        while True:
+            url = await self.queue.get()
+            try:
+                response = await self._fetch(url)
+                if response is not None:
+                    await asyncio.to_thread(self._process, url, response)
+            except asyncio.CancelledError:
+                # Cut off mid-fetch: the URL stays claimed, for release() to hand back
+                self.queue.task_done()
+                raise
+            except Exception as e:
+                logger.error(f"Error getting links from {url}: {e}")
+
+            self.fetched += 1
+            self.completed.append(url)
+            self.leased.discard(url)
+            try:
+                if len(self.completed) >= self.concurrency:
+                    await self._flush_completed()
+                if not self.fetched % 50:
+                    await asyncio.to_thread(self._log_progress)
+            finally:
+                self.queue.task_done()
+
+    def _process(self, url: str, response) -> None:
+        """
+        Stages a fetched page and queues its links. Runs in the thread pool.
+        """
+        headers = getattr(response, "headers", None) or {}
+        content_type = headers.get("Content-Type", "")
+        # PDFs and other documents have no links to follow
+        is_html = not content_type or "html" in content_type
+        page = (
+            self.scraper._extract_page(response.content, url, content_type) if is_html else None
+        )
+
+        canonical = self.scraper._canonical_url(url, response, page)
+        if canonical != url and not self.frontier.mark_visited([canonical]):
+            # The canonical page is fetched under its own URL
+            logger.info(f"Skipping {url}: its canonical URL {canonical} is already crawled")
+        elif self.single_fetch:
+            validators = self.scraper._response_validators(response)
+            self.on_content(canonical, response.content, content_type, validators)
+        if page is None:
+            return
+
+        extracted_links = self.scraper._same_domain_links(page, url)
+        if not extracted_links:
+            logger.warning(f"No links extracted from {url}")
+        new_links = {}
+        for link, anchor in self.scraper._canonical_links(extracted_links).items():
+            with self.submitted_lock:
+                submitted = self.submitted.add(link)
+            if submitted:
+                new_links[link] = self.scorer.score(link, anchor)
+        self.frontier.add(new_links)
+
+    async def _fetch(self, url: str):
+        """
+        Fetches a page and returns the response, or None if it could not be retrieved.
+        """
+        if self.scraper.fetch_cache.replay:
+            try:
+                return await asyncio.to_thread(self.scraper._replay, url)
+            except FetchCacheMiss as e:
+                logger.warning(f"Skipping {url}: {e}")
+                return None
+
+        host = urlparse(url).netloc
+        response = None
+        try:
+            async with self.slots.slot(host):
+                started = time.monotonic()
+                try:
+                    response = await self.client.send(
+                        self.client.build_request("GET", url), stream=True
+                    )
+                    await aread_limited(response)
+                    await asyncio.to_thread(
+                        self.limiter.record,
+                        host,
+                        response.status_code,
+                        time.monotonic() - started,
+                        response.headers.get("Retry-After"),
+                    )
+                except httpx.HTTPError as e:
+                    await asyncio.to_thread(
+                        self.limiter.record, host, None, time.monotonic() - started
+                    )
+                    logger.warning(f"Direct fetch failed for {url}: {e}")
+                except ResponseTooLarge as e:
+                    logger.warning(f"Skipping {url}: {e}")
+                    return None
+
+            if response is not None:
+                if response.status_code == 200 and not self._is_challenge(response.text):
+                    await asyncio.to_thread(self.scraper._cache_response, url, response)
+                    await asyncio.to_thread(self._record, url, response)
+                    return response
+                if (
+                    response.status_code not in FALLBACK_STATUS_CODES
+                    and response.status_code != 200
+                ):
+                    await asyncio.to_thread(self._record, url, response)
+                    logger.warning(f"Got status code {response.status_code} for {url}")
+                    return None
+
+            # Blocked, challenged or unreachable: use the Scraper's bypass chain off the event
+            # loop. It goes through the same host limiter, so a throttled host is waited out.
+            async with self.fallback_slots:
+                response = await asyncio.to_thread(self.scraper._make_request, url)
+        except (HostUnavailable, ResponseTooLarge) as e:
+            logger.warning(f"Skipping {url}: {e}")
+            return None
+
+        if response.status_code == 200:
+            await asyncio.to_thread(self._record, url, response)
+            return response
+
+        logger.warning(f"Got status code {response.status_code} for {url}")
+        return None
+
+    def _record(self, url: str, response) -> None:
+        # Blocked and throttled responses are left out; the fixture server injects its own
+        if self.recorder is not None:
+            self.recorder.record_response(url, response)
+
+    def _is_challenge(self, text: str) -> bool:
+        return any(marker in text for marker in CHALLENGE_MARKERS)
+
+    def _log_progress(self) -> None:
+        stats = self.frontier.stats()
+        claimed = int(stats.get("claimed", 0))
+        discovered = int(stats.get("discovered", 0))
+        max_links = int(stats.get("max_links", 0)) or 1
+        rate = self.fetched / max(time.monotonic() - self.started_at, 1e-6)
+        logger.info(
+            f"Progress: {claimed / max_links * 100:.1f}% - Shard {self.shard} fetched: "
+            f"{self.fetched}, Crawl fetched: {stats.get('fetched', 0)}, "
+            f"Discovered: {discovered}, Rate: {rate:.1f} pages/s"
+        )
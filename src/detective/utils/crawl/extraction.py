@@ -0,0 +1,188 @@
+import codecs
+import logging
+import re
+from typing import NamedTuple
+from urllib.parse import urljoin
+
+import lxml.html
+from bs4 import BeautifulSoup, NavigableString
+from django.conf import settings
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("lxml", "bs4")
+
+CHALLENGE_PATTERN = re.compile(r"Verifying your connection|Security check", re.I)
+
+# Elements whose text never reaches the page text (BeautifulSoup leaves them out as well)
+SKIPPED_TAGS = ("script", "style", "template")
+
+# Elements that start a new text block. Blocks are what the boilerplate filter recognises
+# across a site's pages.
+BLOCK_TAGS = frozenset(
+    (
+        "address article aside blockquote body caption dd details dialog div dl dt fieldset "
+        "figcaption figure footer form h1 h2 h3 h4 h5 h6 head header hr html li main nav ol "
+        "p pre section summary table tbody td tfoot th thead title tr ul"
+    ).split()
+)
+
+SKIPPED_HREF_PREFIXES = ("#", "javascript:", "mailto:", "tel:")
+
+# A charset declared in the first bytes of a page, from <meta charset> or http-equiv
+CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.I)
+# The charset parameter of a Content-Type header
+HEADER_CHARSET_PATTERN = re.compile(r"""charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.I)
+
+# Byte order marks, which take precedence over any declared charset
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+class ExtractedPage(NamedTuple):
+    text: str
+    # The text split at block-level elements; joined by spaces they make up text
+    blocks: list
+    # {absolute url: anchor text} for every followable link on the page
+    links: dict
+    # The page is an anti-bot challenge rather than the content asked for
+    challenge: bool
+    # Absolute URL of the page's <link rel="canonical">, or "" if it declares none
+    canonical: str = ""
+
+
+def extract_page(
+    content, base_url: str, backend: str = None, content_type: str = ""
+) -> ExtractedPage:
+    """
+    Extracts a page's visible text and links in one pass. A page given as bytes is decoded
+    by its byte order mark, else the charset of its Content-Type header (content_type), else
+    its <meta> charset, else as UTF-8.
+
+    The lxml backend parses with libxml2 and is several times faster than BeautifulSoup's
+    pure-Python html.parser, which is kept as the fallback for documents lxml rejects. Both
+    produce the same text: stripped strings joined by spaces, without scripts, styles or
+    comments.
+    """
+    backend = backend or settings.HTML_EXTRACTION_BACKEND
+    if backend == "lxml":
+        try:
+            return _extract_lxml(content, base_url, content_type)
+        except (etree.ParserError, etree.XMLSyntaxError, ValueError) as e:
+            logger.info(f"lxml could not parse {base_url} ({e}); using BeautifulSoup")
+    return _extract_soup(content, base_url, content_type)
+
+
+def _declared_charsets(content: bytes, content_type: str):
+    header = HEADER_CHARSET_PATTERN.search(content_type or "")
+    if header:
+        yield header.group(1)
+    meta = CHARSET_PATTERN.search(content[:2048])
+    if meta:
+        yield meta.group(1).decode("ascii")
+
+
+def _decode(content, content_type: str = "") -> str:
+    if isinstance(content, str):
+        return content
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            return content[len(bom) :].decode(encoding, errors="replace")
+    for encoding in _declared_charsets(content, content_type):
+        try:
+            return content.decode(encoding, errors="replace")
+        except LookupError:
+            continue
+    return content.decode("utf-8", errors="replace")
+
+
+def _add_link(links: dict, base_url: str, href, anchor: str) -> None:
+    href = (href or "").strip()
+    if not href or href.startswith(SKIPPED_HREF_PREFIXES):
+        return
+    url = urljoin(base_url, href)
+    if url not in links or len(links[url]) < len(anchor):
+        links[url] = anchor
+
+
+def _canonical_link(base_url: str, links) -> str:
+    for rel, href in links:
+        if "canonical" in rel and (href or "").strip():
+            return urljoin(base_url, href.strip())
+    return ""
+
+
+def _extract_lxml(content, base_url: str, content_type: str = "") -> ExtractedPage:
+    parser = lxml.html.HTMLParser(remove_comments=True, remove_pis=True)
+    root = lxml.html.document_fromstring(_decode(content, content_type), parser=parser)
+    etree.strip_elements(root, *SKIPPED_TAGS, with_tail=False)
+
+    # Element text comes at its start event and tail text at its end, in document order
+    blocks = []
+    current = []
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        if element.tag in BLOCK_TAGS and current:
+            blocks.append(" ".join(current))
+            current = []
+        piece = element.text if event == "start" else element.tail
+        if piece and piece.strip():
+            current.append(piece.strip())
+    if current:
+        blocks.append(" ".join(current))
+    text = " ".join(blocks)
+
+    links = {}
+    for a_tag in root.iter("a"):
+        href = a_tag.get("href")
+        if href is None:
+            continue
+        anchor = " ".join(s.strip() for s in a_tag.itertext() if s.strip())
+        _add_link(links, base_url, href, anchor or a_tag.get("title") or "")
+
+    canonical = _canonical_link(
+        base_url,
+        ((link.get("rel", "").lower().split(), link.get("href")) for link in root.iter("link")),
+    )
+    return ExtractedPage(text, blocks, links, bool(CHALLENGE_PATTERN.search(text)), canonical)
+
+
+def _extract_soup(content, base_url: str, content_type: str = "") -> ExtractedPage:
+    # Decoded the same way as for lxml, so both backends see the same text
+    soup = BeautifulSoup(_decode(content, content_type), "html.parser")
+
+    # Consecutive strings under the same nearest block element form a block
+    blocks = []
+    current = []
+    current_block = None
+    for string in soup.find_all(string=True):
+        # Comments, scripts, styles and templates are NavigableString subclasses
+        if type(string) is not NavigableString or not string.strip():
+            continue
+        block = string.find_parent(BLOCK_TAGS)
+        if block is not current_block and current:
+            blocks.append(" ".join(current))
+            current = []
+        current_block = block
+        current.append(string.strip())
+    if current:
+        blocks.append(" ".join(current))
+    text = " ".join(blocks)
+
+    links = {}
+    for a_tag in soup.find_all("a", href=True):
+        anchor = a_tag.get_text(" ", strip=True) or a_tag.get("title") or ""
+        _add_link(links, base_url, a_tag["href"], anchor)
+
+    # BeautifulSoup splits rel into a list of values
+    canonical = _canonical_link(
+        base_url,
+        (
+            ([rel.lower() for rel in link.get("rel") or []], link.get("href"))
+            for link in soup.find_all("link")
+        ),
+    )
+    return ExtractedPage(text, blocks, links, bool(CHALLENGE_PATTERN.search(text)), canonical)
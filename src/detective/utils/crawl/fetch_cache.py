@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+import tempfile
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = "blobs"
+URLS_DIR = "urls"
+CHUNK_SIZE = 64 * 1024
+
+
+class FetchCacheMiss(Exception):
+    """A page asked for in replay mode is not in the fetch cache"""
+
+
+class CachedResponse:
+    """Minimal response served from the fetch cache"""
+
+    def __init__(self, url, content, headers):
+        self.url = url
+        self.content = content
+        self.status_code = 200
+        self.headers = headers
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+
+def _sharded(directory: str, digest: str, extension: str) -> str:
+    return f"{directory}/{digest[:2]}/{digest}{extension}"
+
+
+class FetchCache:
+    """
+    Cache of raw fetched responses, so pages can be re-processed without crawling the site
+    again.
+
+    Bodies are stored gzipped under the SHA-256 of their content, so a page that comes back
+    unchanged, or is served under several URLs, is stored once. A small JSON entry per
+    canonical URL points at its body and keeps the headers that parsing and revalidation need.
+    Both live in FETCH_CACHE_BACKEND storage: a directory on local disk, or the S3 bucket of
+    custom_storages.FetchCacheStorage. Entries expire after FETCH_CACHE_TTL and the cache is
+    trimmed to FETCH_CACHE_MAX_BYTES, oldest entries first, by the evict_fetch_cache task.
+
+    In replay mode (FETCH_CACHE_REPLAY) the Scraper and crawl engine serve pages only from the
+    cache and make no requests.
+    """
+
+    def __init__(self, storage=None) -> None:
+        self.backend = settings.FETCH_CACHE_BACKEND
+        self.ttl = settings.FETCH_CACHE_TTL
+        self.max_bytes = settings.FETCH_CACHE_MAX_BYTES
+        self.replay = settings.FETCH_CACHE_REPLAY
+        self.storage = storage or self._storage()
+
+    def _storage(self):
+        if self.backend == "disk":
+            return FileSystemStorage(location=settings.FETCH_CACHE_DIR)
+        if self.backend == "s3":
+            from custom_storages import FetchCacheStorage
+
+            return FetchCacheStorage()
+        return None
+
+    @property
+    def enabled(self) -> bool:
+        return self.storage is not None
+
+    def _entry_name(self, url: str) -> str:
+        return _sharded(URLS_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest(), ".json")
+
+    def _write(self, name: str, data: bytes) -> None:
+        # Local storage never overwrites; it would save the new file under another name
+        if self.storage.exists(name):
+            self.storage.delete(name)
+        self.storage.save(name, ContentFile(data))
+
+    def put(self, url: str, response) -> None:
+        """
+        Stores a successful response for url, its canonical URL. A PDF spooled to
+        response.document is read from there a chunk at a time.
+        """
+        if not self.enabled or response.status_code != 200:
+            return
+
+        body = getattr(response, "document", None) or io.BytesIO(response.content)
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in iter(partial(body.read, CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        body.seek(0)
+
+        blob = _sharded(BLOBS_DIR, digest.hexdigest(), ".gz")
+        headers = getattr(response, "headers", None) or {}
+        entry = {
+            "url": str(getattr(response, "url", "") or url),
+            "blob": blob,
+            "size": size,
+            "fetched_at": time.time(),
+            "headers": {
+                name: headers.get(name)
+                for name in ("Content-Type", "ETag", "Last-Modified")
+                if headers.get(name)
+            },
+        }
+        try:
+            if not self.storage.exists(blob):
+                self._save_compressed(blob, body)
+            self._write(self._entry_name(url), json.dumps(entry).encode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Could not cache the response of {url}: {e}")
+        finally:
+            body.seek(0)
+
+    def _save_compressed(self, name: str, body) -> None:
+        with tempfile.SpooledTemporaryFile(max_size=settings.SCRAPER_PDF_SPOOL_BYTES) as blob:
+            with gzip.GzipFile(fileobj=blob, mode="wb", compresslevel=6) as compressed:
+                for chunk in iter(partial(body.read, CHUNK_SIZE), b""):
+                    compressed.write(chunk)
+            blob.seek(0)
+            self.storage.save(name, File(blob))
+
+    def get(self, url: str):
+        """
+        The cached response for url, or None if it is not cached or has expired
+        """
+        if not self.enabled:
+            return None
+        name = self._entry_name(url)
+        try:
+            with self.storage.open(name) as f:
+                entry = json.loads(f.read())
+            if time.time() - entry["fetched_at"] > self.ttl:
+                return None
+            with self.storage.open(entry["blob"]) as f:
+                content = gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read the cached response of {url}: {e}")
+            return None
+        return CachedResponse(entry["url"], content, entry["headers"])
+
+    def _list(self, directory: str) -> list:
+        names = []
+        try:
+            shards, _ = self.storage.listdir(directory)
+        except FileNotFoundError:
+            return names
+        for shard in shards:
+            _, files = self.storage.listdir(f"{directory}/{shard}")
+            names.extend(f"{directory}/{shard}/{name}" for name in files)
+        return names
+
+    def evict(self) -> int:
+        """
+        Removes expired entries, then the oldest entries while the cache is over its size limit,
+        then bodies no entry points at. Returns the number of entries removed.
+        """
+        if not self.enabled:
+            return 0
+
+        now = time.time()
+        entries = []
+        removed = 0
+        for name in self._list(URLS_DIR):
+            try:
+                with self.storage.open(name) as f:
+                    entry = json.loads(f.read())
+            except Exception:
+                entry = None
+            if entry is None or now - entry["fetched_at"] > self.ttl:
+                self.storage.delete(name)
+                removed += 1
+            else:
+                entries.append((entry["fetched_at"], name, entry["blob"]))
+
+        blob_sizes = {name: self.storage.size(name) for name in self._list(BLOBS_DIR)}
+        referenced = {}
+        for _, _, blob in entries:
+            referenced[blob] = referenced.get(blob, 0) + 1
+        total = sum(size for blob, size in blob_sizes.items() if blob in referenced)
+
+        entries.sort()
+        for _, name, blob in entries:
+            if total <= self.max_bytes:
+                break
+            self.storage.delete(name)
+            removed += 1
+            referenced[blob] -= 1
+            if not referenced[blob]:
+                total -= blob_sizes.get(blob, 0)
+
+        for blob in blob_sizes:
+            if not referenced.get(blob):
+                self.storage.delete(blob)
+
+        logger.info(f"Evicted {removed} entries from the fetch cache, {total} bytes left")
+        return removed
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from detective.utils.crawl.warc import read_warc
+
+logger = logging.getLogger(__name__)
+
+# Headers of recorded responses that the fixture server sets itself
+SERVER_HEADERS = {"content-length", "date", "server", "connection", "keep-alive"}
+
+CHALLENGE_PAGE = b"""<!DOCTYPE html>
+<html lang="en-US"><head><title>Just a moment...</title></head>
+<body><div class="main-wrapper"><h1>Verifying your connection</h1>
+<p>This process is automatic. Your browser will redirect to your requested content shortly.</p>
+<noscript>Enable JavaScript and cookies to continue</noscript></div></body></html>
+"""
+
+
+def _path(url: str) -> str:
+    parts = urlsplit(url)
+    return (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+
+class FixtureSite:
+    """
+    Serves responses recorded to WARC files by a real crawl over local HTTP, so the crawler
+    can be benchmarked reproducibly without network access.
+
+    Pages are looked up by path and query, whichever host they were recorded from, and links
+    and redirects to the recorded hosts are rewritten to point at the fixture server. Each
+    request can be delayed by `latency` +/- `jitter` seconds, and answered with a 429 (at
+    `throttle_rate`) or a Cloudflare-style challenge page (at `challenge_rate`) instead of the
+    page. Whether the n-th request for a path is throttled or challenged depends only on
+    `seed`, so runs are repeatable however requests interleave.
+    """
+
+    def __init__(
+        self,
+        warc_paths,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        throttle_rate: float = 0.0,
+        challenge_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.challenge_rate = challenge_rate
+        self.seed = seed
+        self.stats = Counter()
+        self.origins = set()
+        self.pages = {}
+        self._attempts = Counter()
+        self._lock = threading.Lock()
+        self.server = None
+
+        for path in warc_paths:
+            for record in read_warc(path):
+                self._add(record)
+        logger.info(f"Loaded {len(self.pages)} pages from {len(warc_paths)} WARC files")
+
+    def _add(self, record) -> None:
+        parts = urlsplit(record.url)
+        if not parts.netloc:
+            return
+        self.origins.add(f"{parts.scheme}://{parts.netloc}")
+        key = _path(record.url)
+        # The bypass chain records a blocked page before the copy that got through
+        previous = self.pages.get(key)
+        if previous is None or (previous.status_code >= 400 and record.status_code < 400):
+            self.pages[key] = record
+
+    def _roll(self, kind: str, path: str, attempt: int) -> float:
+        """
+        A number in [0, 1) fixed by the seed, the path and the attempt
+        """
+        digest = hashlib.sha1(f"{self.seed}:{kind}:{path}:{attempt}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") / 2**64
+
+    def _rewrite(self, data: bytes) -> bytes:
+        for origin in self.origins:
+            netloc = origin.split("://", 1)[1]
+            data = data.replace(origin.encode("utf-8"), self.url.encode("utf-8"))
+            data = data.replace(f"//{netloc}".encode("utf-8"), f"//{self.netloc}".encode("utf-8"))
+        return data
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def respond(self, path: str):
+        """
+        The status, headers and body to answer a request for path with
+        """
+        with self._lock:
+            attempt = self._attempts[path]
+            self._attempts[path] += 1
+        self._count("requests")
+
+        delay = self.latency + self.jitter * (2 * self._roll("latency", path, attempt) - 1)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self._roll("throttle", path, attempt) < self.throttle_rate:
+            self._count("throttled")
+            return (
+                429,
+                [("Retry-After", "1"), ("Content-Type", "text/plain")],
+                b"Too Many Requests",
+            )
+        if self._roll("challenge", path, attempt) < self.challenge_rate:
+            self._count("challenged")
+            headers = [
+                ("Content-Type", "text/html; charset=UTF-8"),
+                ("cf-mitigated", "challenge"),
+                ("Server", "cloudflare"),
+            ]
+            return 403, headers, CHALLENGE_PAGE
+
+        record = self.pages.get(path)
+        if record is None:
+            self._count("not_found")
+            return 404, [("Content-Type", "text/plain")], b"Not Found"
+
+        headers = [
+            (name, self._rewrite(value.encode("utf-8")).decode("utf-8"))
+            for name, value in record.headers
+            if name.lower() not in SERVER_HEADERS
+        ]
+        content = self._rewrite(record.content)
+        self._count("served")
+        self._count("bytes", len(content))
+        return record.status_code, headers, content
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Starts serving in a background thread. Returns the server's base URL.
+        """
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, headers, content = site.respond(self.path)
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.netloc = f"{host}:{self.server.server_address[1]}"
+        self.url = f"http://{self.netloc}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
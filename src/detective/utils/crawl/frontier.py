@@ -0,0 +1,357 @@
+import logging
+import time
+
+from django.conf import settings
+
+from detective.utils.crawl.visited import bloom_parameters, bloom_positions, url_fingerprint
+
+logger = logging.getLogger(__name__)
+
+STATUS_RUNNING = "running"
+STATUS_FINISHED = "finished"
+
+# Bumped when the key layout changes, so a crawl left over from an older layout is not resumed
+FRONTIER_VERSION = "2"
+
+# Score of the start URL, which always goes first
+SEED_SCORE = 1_000_000
+
+# URLs per ADD_SCRIPT call; Redis runs nothing else while a script runs, so a large sitemap is
+# added in several calls
+ADD_BATCH_SIZE = 500
+
+# Adds URLs to the frontier, ranked by score, while bounding the number of candidates.
+# The visited set is a Bloom filter on a Redis bitmap: a URL is new if any of its bits is 0.
+# Once the frontier holds max_candidates URLs, a new URL only gets in by displacing its
+# shard's lowest-scored queued URL.
+# KEYS[1] = visited bitmap, KEYS[2] = state hash, KEYS[3] = scores hash
+# ARGV[1] = queue key prefix, ARGV[2] = hashes per URL (k),
+# ARGV[3..] = groups of (url, shard, score, k bit positions)
+# Queue keys are derived from ARGV because the shard count is dynamic; every key shares
+# the company prefix, so they live on the same Redis node.
+ADD_SCRIPT = """
+local max_candidates = tonumber(redis.call('HGET', KEYS[2], 'max_candidates') or '0')
+local discovered = tonumber(redis.call('HGET', KEYS[2], 'discovered') or '0')
+local k = tonumber(ARGV[2])
+local added = {}
+local i = 3
+while i <= #ARGV do
+    local url = ARGV[i]
+    local queue = ARGV[1] .. ARGV[i + 1]
+    local score = tonumber(ARGV[i + 2])
+    local is_new = false
+    for j = 1, k do
+        if redis.call('GETBIT', KEYS[1], ARGV[i + 2 + j]) == 0 then
+            is_new = true
+            break
+        end
+    end
+    local accept = false
+    if is_new then
+        if discovered < max_candidates then
+            accept = true
+            discovered = discovered + 1
+        else
+            local lowest = redis.call('ZRANGE', queue, 0, 0, 'WITHSCORES')
+            if lowest[1] and tonumber(lowest[2]) < score then
+                redis.call('ZREM', queue, lowest[1])
+                redis.call('HDEL', KEYS[3], lowest[1])
+                accept = true
+            end
+        end
+    end
+    if accept then
+        for j = 1, k do
+            redis.call('SETBIT', KEYS[1], ARGV[i + 2 + j], 1)
+        end
+        redis.call('ZADD', queue, score, url)
+        redis.call('HSET', KEYS[3], url, score)
+        table.insert(added, url)
+    end
+    i = i + 3 + k
+end
+redis.call('HSET', KEYS[2], 'discovered', discovered)
+return added
+"""
+
+# Pops up to ARGV[1] of a shard's highest-scored URLs, within the crawl's link budget, and
+# leases them until ARGV[2].
+# KEYS[1] = shard queue, KEYS[2] = leases sorted set, KEYS[3] = state hash
+CLAIM_SCRIPT = """
+local max_links = tonumber(redis.call('HGET', KEYS[3], 'max_links') or '0')
+local claimed = tonumber(redis.call('HGET', KEYS[3], 'claimed') or '0')
+local count = math.min(tonumber(ARGV[1]), max_links - claimed)
+if count <= 0 then
+    return {}
+end
+local popped = redis.call('ZPOPMAX', KEYS[1], count)
+local urls = {}
+for i = 1, #popped, 2 do
+    redis.call('ZADD', KEYS[2], ARGV[2], popped[i])
+    table.insert(urls, popped[i])
+end
+redis.call('HINCRBY', KEYS[3], 'claimed', #urls)
+return urls
+"""
+
+
+class CrawlFrontier:
+    """
+    Redis-backed crawl frontier for a company, shared by every gd_scrape worker expanding its
+    domain.
+
+    URLs are sharded by hash over `shards` queues so several crawl tasks can expand the domain
+    in parallel. Each queue is a sorted set ranked by relevance score, and the link budget is
+    spent on claims rather than discoveries, so the best-scored pages are fetched first and
+    the budget goes to them. Claimed URLs are leased rather than removed, so a worker killed
+    mid-crawl loses nothing: expired leases go back on their queue and a restarted crawl
+    resumes from the persisted frontier instead of starting over.
+
+    Visited URLs are kept as a Bloom filter on a Redis bitmap sized for the crawl's candidates,
+    so its memory is fixed per crawl regardless of URL length. A false positive
+    (CRAWL_VISITED_ERROR_RATE) means a new URL is taken for a visited one and skipped.
+    """
+
+    KEY_PREFIX = "gd:crawl"
+
+    def __init__(self, company_id, shards: int = None, redis=None) -> None:
+        self.redis = redis or settings.REDIS_CONN
+        self.shards = shards or settings.CRAWL_FRONTIER_SHARDS
+        self.lease_seconds = settings.CRAWL_FRONTIER_LEASE_SECONDS
+        self.ttl = settings.CRAWL_FRONTIER_TTL
+        self.error_rate = settings.CRAWL_VISITED_ERROR_RATE
+        self.candidate_factor = settings.CRAWL_FRONTIER_CANDIDATE_FACTOR
+        self._bloom = None
+
+        base = f"{self.KEY_PREFIX}:{company_id}"
+        self.visited_key = f"{base}:visited"
+        self.state_key = f"{base}:state"
+        self.leases_key = f"{base}:leases"
+        self.scores_key = f"{base}:scores"
+        self.queue_prefix = f"{base}:queue:"
+        self.queue_keys = [f"{self.queue_prefix}{shard}" for shard in range(self.shards)]
+
+        self._add_script = self.redis.register_script(ADD_SCRIPT)
+        self._claim_script = self.redis.register_script(CLAIM_SCRIPT)
+
+    def start(self, start_url: str, max_links: int) -> bool:
+        """
+        Prepares the frontier for a crawl of start_url. An unfinished crawl of the same URL is
+        resumed; anything else is discarded and the frontier is seeded afresh.
+        Returns True if an existing crawl is being resumed.
+        """
+        state = self.redis.hgetall(self.state_key)
+        max_candidates = max_links * self.candidate_factor
+        if (
+            state.get("status") == STATUS_RUNNING
+            and state.get("start_url") == start_url
+            and state.get("version") == FRONTIER_VERSION
+        ):
+            # The visited filter keeps its original sizing; a larger budget only raises its
+            # false-positive rate above the configured one
+            self.requeue_expired()
+            self.redis.hset(
+                self.state_key,
+                mapping={"max_links": max_links, "max_candidates": max_candidates},
+            )
+            logger.info(
+                f"Resuming crawl of {start_url} - Discovered: {state.get('discovered', 0)}, "
+                f"Fetched: {state.get('fetched', 0)}"
+            )
+            self.checkpoint()
+            return True
+
+        self.reset()
+        num_bits, num_hashes = bloom_parameters(max_candidates, self.error_rate)
+        self.redis.hset(
+            self.state_key,
+            mapping={
+                "version": FRONTIER_VERSION,
+                "status": STATUS_RUNNING,
+                "start_url": start_url,
+                "max_links": max_links,
+                "max_candidates": max_candidates,
+                "bloom_bits": num_bits,
+                "bloom_hashes": num_hashes,
+                "discovered": 0,
+                "claimed": 0,
+                "fetched": 0,
+                "dispatched": 0,
+                "started_at": time.time(),
+            },
+        )
+        self.add({start_url: SEED_SCORE})
+        self.checkpoint()
+        return False
+
+    def reset(self) -> None:
+        self._bloom = None
+        self.redis.delete(*self._keys())
+
+    def _keys(self) -> list:
+        return [
+            self.visited_key,
+            self.state_key,
+            self.leases_key,
+            self.scores_key,
+            *self.queue_keys,
+        ]
+
+    def shard_for(self, url: str) -> int:
+        return url_fingerprint(url) % self.shards
+
+    def _bloom_parameters(self):
+        if self._bloom is None:
+            num_bits, num_hashes = self.redis.hmget(
+                self.state_key, ["bloom_bits", "bloom_hashes"]
+            )
+            if num_bits is None:
+                return None
+            self._bloom = (int(num_bits), int(num_hashes))
+        return self._bloom
+
+    def add(self, urls) -> list:
+        """
+        Adds URLs not visited before. urls is either {url: relevance score} or a list of URLs,
+        which then score 0. Large sets are added ADD_BATCH_SIZE at a time. Returns the URLs
+        added.
+        """
+        bloom = self._bloom_parameters()
+        if bloom is None:
+            # Crawl state is gone (expired or reset), so there is no budget to add against
+            return []
+
+        if not isinstance(urls, dict):
+            urls = dict.fromkeys(urls, 0)
+
+        num_bits, num_hashes = bloom
+        items = list(urls.items())
+        added = []
+        for i in range(0, len(items), ADD_BATCH_SIZE):
+            args = [self.queue_prefix, num_hashes]
+            for url, score in items[i : i + ADD_BATCH_SIZE]:
+                args.extend([url, self.shard_for(url), score])
+                args.extend(bloom_positions(url, num_bits, num_hashes))
+            added.extend(
+                self._add_script(
+                    keys=[self.visited_key, self.state_key, self.scores_key], args=args
+                )
+            )
+        return added
+
+    def mark_visited(self, urls) -> list:
+        """
+        Records URLs as visited without queueing them or spending link budget, e.g. pages known
+        to be unchanged since they were last staged. Links found elsewhere to these URLs are
+        skipped. Returns the URLs that were not visited before.
+        """
+        bloom = self._bloom_parameters()
+        if bloom is None:
+            return []
+
+        urls = list(urls)
+        num_bits, num_hashes = bloom
+        pipe = self.redis.pipeline(transaction=False)
+        for url in urls:
+            for position in bloom_positions(url, num_bits, num_hashes):
+                pipe.setbit(self.visited_key, position, 1)
+        previous = pipe.execute()
+        return [
+            url
+            for i, url in enumerate(urls)
+            if not all(previous[i * num_hashes : (i + 1) * num_hashes])
+        ]
+
+    def claim(self, shard: int, count: int) -> list:
+        """
+        Leases up to count of the highest-scored URLs from a shard queue, within the crawl's
+        link budget.
+        """
+        expires_at = time.time() + self.lease_seconds
+        return self._claim_script(
+            keys=[self.queue_keys[shard], self.leases_key, self.state_key],
+            args=[count, expires_at],
+        )
+
+    def complete(self, urls) -> None:
+        if not urls:
+            return
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.leases_key, *urls)
+        pipe.hdel(self.scores_key, *urls)
+        pipe.hincrby(self.state_key, "fetched", len(urls))
+        pipe.execute()
+
+    def mark_dispatched(self, count: int) -> int:
+        """
+        Records count URLs as dispatched for scraping. Returns the offset of the first one.
+        """
+        return self.redis.hincrby(self.state_key, "dispatched", count) - count
+
+    def release(self, urls) -> int:
+        """
+        Gives up the leases on URLs that were claimed but not fetched, putting them back on
+        their shard queue with their original score and returning their share of the link
+        budget. Returns how many were released.
+        """
+        if not urls:
+            return 0
+
+        pipe = self.redis.pipeline()
+        for url in urls:
+            pipe.zrem(self.leases_key, url)
+        removed = pipe.execute()
+        # Another worker may have requeued some of them in the meantime
+        urls = [url for url, was_leased in zip(urls, removed) if was_leased]
+        if not urls:
+            return 0
+
+        scores = self.redis.hmget(self.scores_key, urls)
+        pipe = self.redis.pipeline()
+        for url, score in zip(urls, scores):
+            pipe.zadd(self.queue_keys[self.shard_for(url)], {url: float(score or 0)})
+        pipe.hincrby(self.state_key, "claimed", -len(urls))
+        pipe.execute()
+        return len(urls)
+
+    def requeue_expired(self) -> int:
+        """
+        Releases the URLs whose lease expired (their worker died). Returns how many.
+        """
+        expired = self.redis.zrangebyscore(self.leases_key, "-inf", time.time())
+        requeued = self.release(expired)
+        if requeued:
+            logger.info(f"Requeued {requeued} URLs with expired leases")
+        return requeued
+
+    def is_drained(self) -> bool:
+        """
+        True when no URL is leased by any worker and either no shard has queued URLs or the
+        link budget is spent.
+        """
+        pipe = self.redis.pipeline()
+        pipe.zcard(self.leases_key)
+        pipe.hmget(self.state_key, ["max_links", "claimed"])
+        for key in self.queue_keys:
+            pipe.zcard(key)
+        leased, (max_links, claimed), *queued = pipe.execute()
+        if leased:
+            return False
+        return not any(queued) or int(claimed or 0) >= int(max_links or 0)
+
+    def checkpoint(self) -> None:
+        """
+        Records progress and keeps the frontier alive for another TTL window.
+        """
+        pipe = self.redis.pipeline()
+        pipe.hset(self.state_key, "updated_at", time.time())
+        for key in self._keys():
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def finish(self) -> None:
+        self.redis.hset(self.state_key, "status", STATUS_FINISHED)
+        self.checkpoint()
+
+    def stats(self) -> dict:
+        return self.redis.hgetall(self.state_key)
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the host wants us to slow down
+THROTTLE_STATUS_CODES = {429, 503}
+
+# Takes a token from a host's bucket, refilling it at the host's current rate.
+# Returns 0 when a token was taken, otherwise the seconds to wait before trying again.
+# KEYS[1] = host hash
+# ARGV = now, initial rate, burst, ttl
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local state = redis.call('HMGET', KEYS[1], 'rate', 'tokens', 'refilled_at', 'paused_until')
+local rate = tonumber(state[1]) or tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tokens = tonumber(state[2]) or burst
+local refilled_at = tonumber(state[3]) or now
+local paused_until = tonumber(state[4]) or 0
+
+if paused_until > now then
+    return tostring(paused_until - now)
+end
+
+tokens = math.min(burst, tokens + (now - refilled_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', tokens, 'refilled_at', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return tostring(wait)
+"""
+
+# Adjusts a host's rate from a response (AIMD) and trips its circuit breaker.
+# Throttling cuts the rate by the decrease factor and honours Retry-After; successes add to
+# the rate while the host answers within the target latency and back off gently when it slows
+# down. Enough
+# consecutive failures pause the host, for twice as long each time it trips again (up to 32x
+# the cooldown); the first request after a pause is a probe, and a single failure re-opens
+# the breaker.
+# KEYS[1] = host hash
+# ARGV = now, outcome ("ok" | "throttled" | "failed"), latency, retry_after,
+#        initial rate, min rate, max rate, increase, decrease, target latency,
+#        failure threshold, cooldown, ttl
+FEEDBACK_SCRIPT = """
+local now = tonumber(ARGV[1])
+local outcome = ARGV[2]
+local latency = tonumber(ARGV[3])
+local retry_after = tonumber(ARGV[4])
+local min_rate = tonumber(ARGV[6])
+local max_rate = tonumber(ARGV[7])
+local state = redis.call('HMGET', KEYS[1], 'rate', 'latency', 'failures', 'trips')
+local rate = tonumber(state[1]) or tonumber(ARGV[5])
+local avg_latency = tonumber(state[2]) or latency
+local failures = tonumber(state[3]) or 0
+local trips = tonumber(state[4]) or 0
+
+if outcome == 'ok' then
+    avg_latency = 0.8 * avg_latency + 0.2 * latency
+    if avg_latency > tonumber(ARGV[10]) then
+        rate = rate * 0.9
+    else
+        rate = rate + tonumber(ARGV[8])
+    end
+    failures = 0
+    trips = 0
+else
+    failures = failures + 1
+    if outcome == 'throttled' then
+        rate = rate * tonumber(ARGV[9])
+    end
+end
+rate = math.max(min_rate, math.min(max_rate, rate))
+
+local paused_until = 0
+if retry_after > 0 then
+    paused_until = now + retry_after
+end
+if failures >= tonumber(ARGV[11]) or (trips > 0 and failures > 0) then
+    paused_until = math.max(paused_until, now + tonumber(ARGV[12]) * 2 ^ math.min(trips, 5))
+    trips = trips + 1
+    failures = 0
+end
+if paused_until > 0 then
+    redis.call(
+        'HSET', KEYS[1], 'paused_until', paused_until, 'tokens', 0, 'refilled_at', paused_until
+    )
+end
+
+redis.call(
+    'HSET', KEYS[1], 'rate', rate, 'latency', avg_latency, 'failures', failures, 'trips', trips
+)
+redis.call('EXPIRE', KEYS[1], ARGV[13])
+return tostring(paused_until)
+"""
+
+
+class HostUnavailable(Exception):
+    """
+    Raised when a host is paused (throttled or failing) for longer than the caller can wait
+    """
+
+    def __init__(self, host: str, wait: float) -> None:
+        super().__init__(f"{host} is paused for another {wait:.0f}s")
+        self.host = host
+        self.wait = wait
+
+
+def parse_retry_after(value) -> float:
+    """
+    Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date
+    """
+    if not value:
+        return 0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+class HostRateLimiter:
+    """
+    Adaptive per-host token bucket shared through Redis by every worker.
+
+    Each host starts at CRAWL_HOST_RATE requests per second. The rate grows while the host
+    answers quickly and is cut back on 429/503 responses, so fast sites are crawled at full
+    speed and struggling ones are backed off. Retry-After is honoured, and a circuit breaker
+    pauses a host after CRAWL_HOST_BREAKER_FAILURES consecutive failures.
+    """
+
+    KEY_PREFIX = "gd:host"
+
+    def __init__(self, redis=None) -> None:
+        self.redis = redis or settings.REDIS_CONN
+        self.initial_rate = settings.CRAWL_HOST_RATE
+        self.min_rate = settings.CRAWL_HOST_MIN_RATE
+        self.max_rate = settings.CRAWL_HOST_MAX_RATE
+        self.burst = settings.CRAWL_HOST_BURST
+        self.rate_increase = settings.CRAWL_HOST_RATE_INCREASE
+        self.rate_decrease = settings.CRAWL_HOST_RATE_DECREASE
+        self.target_latency = settings.CRAWL_HOST_TARGET_LATENCY
+        self.failure_threshold = settings.CRAWL_HOST_BREAKER_FAILURES
+        self.cooldown = settings.CRAWL_HOST_BREAKER_COOLDOWN
+        self.max_wait = settings.CRAWL_HOST_MAX_WAIT
+        self.ttl = settings.CRAWL_FRONTIER_TTL
+
+        self._acquire_script = self.redis.register_script(ACQUIRE_SCRIPT)
+        self._feedback_script = self.redis.register_script(FEEDBACK_SCRIPT)
+
+    def _key(self, host: str) -> str:
+        return f"{self.KEY_PREFIX}:{host}"
+
+    def try_acquire(self, host: str) -> float:
+        """
+        Takes a request token for host. Returns 0 on success, otherwise the seconds to wait.
+        """
+        wait = self._acquire_script(
+            keys=[self._key(host)],
+            args=[time.time(), self.initial_rate, self.burst, self.ttl],
+        )
+        return float(wait)
+
+    def paused_for(self, host: str) -> float:
+        """
+        Seconds left before requests to host are allowed again, 0 if it is not paused
+        """
+        paused_until = self.redis.hget(self._key(host), "paused_until")
+        return max(0.0, float(paused_until or 0) - time.time())
+
+    def acquire(self, host: str, max_wait: float = None) -> None:
+        """
+        Blocks until a request to host is allowed. Raises HostUnavailable instead if that would
+        take longer than max_wait.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(host)
+            if not wait:
+                return
+            if waited + wait > max_wait:
+                raise HostUnavailable(host, wait)
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, host: str, max_wait: float = None) -> None:
+        """
+        acquire() for the asyncio crawl engine
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        waited = 0.0
+        while True:
+            # The Redis round trip runs in a thread so the event loop keeps serving requests
+            wait = await asyncio.to_thread(self.try_acquire, host)
+            if not wait:
+                return
+            if waited + wait > max_wait:
+                raise HostUnavailable(host, wait)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def record(self, host: str, status_code=None, latency: float = 0, retry_after=None) -> None:
+        """
+        Feeds a response back into the host's rate. status_code None means the request failed
+        without a response (timeout, connection error).
+        """
+        if status_code in THROTTLE_STATUS_CODES:
+            outcome = "throttled"
+        elif status_code is None or status_code >= 500:
+            outcome = "failed"
+        else:
+            outcome = "ok"
+
+        paused_until = float(
+            self._feedback_script(
+                keys=[self._key(host)],
+                args=[
+                    time.time(),
+                    outcome,
+                    latency,
+                    parse_retry_after(retry_after),
+                    self.initial_rate,
+                    self.min_rate,
+                    self.max_rate,
+                    self.rate_increase,
+                    self.rate_decrease,
+                    self.target_latency,
+                    self.failure_threshold,
+                    self.cooldown,
+                    self.ttl,
+                ],
+            )
+        )
+        if paused_until:
+            logger.warning(f"Pausing requests to {host} for {paused_until - time.time():.0f}s")
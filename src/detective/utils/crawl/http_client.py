@@ -0,0 +1,362 @@
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+
+import anyio
+import cloudscraper
+import httpcore
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool, ProxyManager
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    EmptyPoolError,
+    NameResolutionError,
+    NewConnectionError,
+)
+from urllib3.util.connection import allowed_gai_family
+
+logger = logging.getLogger(__name__)
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return True
+
+
+class DNSCache:
+    """
+    TTL cache of getaddrinfo results, so repeated connections to the same hosts skip the
+    resolver. Failed lookups are not cached. Only the connections of the crawl's own sessions
+    and clients look hosts up here; the rest of the process resolves as usual.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        result = socket.getaddrinfo(*args, **kwargs)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+        return result
+
+    def addresses(self, host: str, port: int, family: int = socket.AF_UNSPEC) -> list:
+        """
+        The IP addresses of host, in the resolver's order. Raises socket.gaierror.
+        """
+        addresses = []
+        for *_, sockaddr in self.getaddrinfo(host, port, family, socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return addresses
+
+
+class _CachedDNSConnection:
+    """
+    Connects to the addresses of the host from the process's DNSCache, trying each in turn
+    like urllib3 does. TLS still verifies the host name.
+    """
+
+    def _new_conn(self):
+        dns_cache = get_dns_cache()
+        host = self._dns_host
+        if dns_cache is None or _is_ip(host):
+            return super()._new_conn()
+        try:
+            addresses = dns_cache.addresses(host, self.port, allowed_gai_family())
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+
+        error = None
+        for address in addresses:
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except (NewConnectionError, ConnectTimeoutError) as e:
+                error = e
+            finally:
+                self._dns_host = host
+        raise error
+
+
+class _CachedDNSHTTPConnection(_CachedDNSConnection, HTTPConnection):
+    pass
+
+
+class _CachedDNSHTTPSConnection(_CachedDNSConnection, HTTPSConnection):
+    pass
+
+
+class _BoundedPool:
+    """
+    Waits at most HTTP_POOL_TIMEOUT seconds for a free connection of a full pool, instead of
+    blocking the thread for good
+    """
+
+    def _get_conn(self, timeout=None):
+        return super()._get_conn(settings.HTTP_POOL_TIMEOUT if timeout is None else timeout)
+
+
+class _HTTPPool(_BoundedPool, HTTPConnectionPool):
+    ConnectionCls = _CachedDNSHTTPConnection
+
+
+class _HTTPSPool(_BoundedPool, HTTPSConnectionPool):
+    ConnectionCls = _CachedDNSHTTPSConnection
+
+
+POOL_CLASSES = {"http": _HTTPPool, "https": _HTTPSPool}
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    Adapter of the shared sessions. pool_block caps the connections per host at
+    HTTP_POOL_MAXSIZE instead of opening throwaway ones beyond it; a request that waits too
+    long for one fails with a ConnectionError.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(
+            pool_connections=settings.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+            pool_block=True,
+        )
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKS proxies bring their own connection classes
+        if type(manager) is ProxyManager:
+            manager.pool_classes_by_scheme = POOL_CLASSES
+        return manager
+
+    def send(self, request, *args, **kwargs):
+        try:
+            return super().send(request, *args, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.ConnectionError(e, request=request) from e
+
+
+class CachedDNSBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend resolving hosts through a DNSCache, for the crawl engine's client
+    """
+
+    def __init__(self, dns_cache: DNSCache) -> None:
+        self.dns_cache = dns_cache
+        self.backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self, host, port, timeout=None, local_address=None, socket_options=None
+    ) -> httpcore.AsyncNetworkStream:
+        if _is_ip(host):
+            addresses = [host]
+        else:
+            try:
+                addresses = await anyio.to_thread.run_sync(self.dns_cache.addresses, host, port)
+            except socket.gaierror as e:
+                raise httpcore.ConnectError(str(e)) from e
+
+        error = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(
+                    address,
+                    port,
+                    timeout=timeout,
+                    local_address=local_address,
+                    socket_options=socket_options,
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(
+            path, timeout=timeout, socket_options=socket_options
+        )
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+
+class ResponseTooLarge(Exception):
+    """
+    Raised when a response body is larger than the limit for its content type
+    """
+
+    def __init__(self, url: str, size: int, limit: int) -> None:
+        super().__init__(f"{url} is over {limit} bytes (got {size})")
+        self.url = url
+        self.size = size
+        self.limit = limit
+
+
+def body_limit(content_type: str) -> int:
+    """
+    Largest body accepted for a Content-Type. Pages without a declared type count as HTML.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type == "application/pdf":
+        return settings.SCRAPER_MAX_PDF_BYTES
+    if not media_type or "html" in media_type or "xml" in media_type:
+        return settings.SCRAPER_MAX_HTML_BYTES
+    if media_type.startswith("text/"):
+        return settings.SCRAPER_MAX_HTML_BYTES
+    return settings.SCRAPER_MAX_OTHER_BYTES
+
+
+def check_declared_size(url: str, headers) -> int:
+    """
+    Raises ResponseTooLarge if the Content-Length is over the limit for the Content-Type,
+    before any of the body is read. Returns the limit.
+    """
+    limit = body_limit(headers.get("Content-Type", ""))
+    length = headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > limit:
+        raise ResponseTooLarge(url, int(length), limit)
+    return limit
+
+
+def iter_limited(response: requests.Response, chunk_size: int = 64 * 1024):
+    """
+    Yields the body of a streamed response in chunks, closing it and raising ResponseTooLarge
+    as soon as it grows past the limit for its type. Compressed bodies are counted decoded.
+    """
+    try:
+        limit = check_declared_size(response.url, response.headers)
+        size = 0
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            size += len(chunk)
+            if size > limit:
+                raise ResponseTooLarge(response.url, size, limit)
+            yield chunk
+    except ResponseTooLarge:
+        response.close()
+        raise
+
+
+def limit_response_body(response: requests.Response, *args, stream=False, **kwargs):
+    """
+    Response hook for the shared sessions. It runs before requests reads the body, so
+    oversized bodies are never loaded. Streamed requests read their own body and only have
+    their declared size checked by their caller.
+    """
+    if not stream:
+        response._content = b"".join(iter_limited(response))
+    return response
+
+
+async def aread_limited(response: httpx.Response) -> bytes:
+    """
+    Reads a streamed httpx response within the limit for its type, like iter_limited
+    """
+    url = str(response.url)
+    try:
+        limit = check_declared_size(url, response.headers)
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > limit:
+                raise ResponseTooLarge(url, size, limit)
+            chunks.append(chunk)
+    finally:
+        await response.aclose()
+    response._content = b"".join(chunks)
+    return response._content
+
+
+_dns_cache = None
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_dns_cache():
+    """
+    This process's DNSCache, or None if HTTP_DNS_CACHE_TTL is 0
+    """
+    global _dns_cache
+    if _dns_cache is None and settings.HTTP_DNS_CACHE_TTL > 0:
+        _dns_cache = DNSCache(settings.HTTP_DNS_CACHE_TTL)
+    return _dns_cache
+
+
+def crawl_transport(**kwargs) -> httpx.AsyncHTTPTransport:
+    """
+    httpx transport of the crawl engine, resolving hosts through the process's DNSCache.
+    Takes the arguments of httpx.AsyncHTTPTransport.
+    """
+    transport = httpx.AsyncHTTPTransport(**kwargs)
+    dns_cache = get_dns_cache()
+    if dns_cache is not None:
+        # httpx has no option for the network backend of its connection pool
+        transport._pool._network_backend = CachedDNSBackend(dns_cache)
+    return transport
+
+
+def _mount(session: requests.Session) -> requests.Session:
+    adapter = PooledAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.hooks["response"].append(limit_response_body)
+    return session
+
+
+def _get_client(name: str, factory):
+    """
+    Returns this process's client of the given kind, creating it on first use. A forked child
+    never inherits its parent's connections.
+    """
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def get_http_session() -> requests.Session:
+    """
+    Keep-alive requests session shared by every plain fetch in this worker process
+    """
+    return _get_client("requests", lambda: _mount(requests.Session()))
+
+
+def get_cloudscraper() -> requests.Session:
+    """
+    Cloudscraper session shared by this worker process. Solved challenges carry over between
+    pages through its cookies.
+    """
+    return _get_client(
+        "cloudscraper",
+        lambda: _mount(
+            cloudscraper.create_scraper(
+                browser={"browser": "chrome", "platform": "windows", "mobile": False}, delay=10
+            )
+        ),
+    )
@@ -0,0 +1,215 @@
+import concurrent.futures
+import ipaddress
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+
+from detective.utils.crawl.http_client import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# Records one proxy outcome and rescores the proxy.
+# Counts are halved once they pass 50 samples so recent results dominate. The score is the
+# smoothed success rate squared over (1 + average latency); proxies below the minimum success
+# rate after enough samples leave the pool. A proxy that is not pooled yet joins only on a
+# success.
+# KEYS[1] = proxy stats hash, KEYS[2] = scores sorted set
+# ARGV = proxy, ok (1 | 0), latency, now, min samples, min success rate, ttl
+RECORD_SCRIPT = """
+local ok = ARGV[2] == '1'
+local state = redis.call('HMGET', KEYS[1], 'successes', 'failures', 'latency')
+local successes = tonumber(state[1]) or 0
+local failures = tonumber(state[2]) or 0
+local latency = tonumber(state[3]) or tonumber(ARGV[3])
+
+if ok then
+    successes = successes + 1
+    latency = 0.7 * latency + 0.3 * tonumber(ARGV[3])
+else
+    failures = failures + 1
+end
+if successes + failures > 50 then
+    successes = successes / 2
+    failures = failures / 2
+end
+
+local success_rate = (successes + 1) / (successes + failures + 2)
+redis.call(
+    'HSET', KEYS[1], 'successes', successes, 'failures', failures, 'latency', latency,
+    'checked_at', ARGV[4]
+)
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+
+if successes + failures >= tonumber(ARGV[5]) and success_rate < tonumber(ARGV[6]) then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return 0
+end
+local score = success_rate * success_rate / (1 + latency)
+if not ok and not redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[2], score, ARGV[1])
+return tostring(score)
+"""
+
+
+def is_local_host(host: str) -> bool:
+    """
+    Checks if a host (with or without port) is this machine or on a private network, where no
+    pooled proxy can reach it
+    """
+    hostname = urlsplit(f"//{host}").hostname or ""
+    if hostname == "localhost" or hostname.endswith(".localhost"):
+        return True
+    try:
+        address = ipaddress.ip_address(hostname)
+    except ValueError:
+        return False
+    return address.is_loopback or address.is_private or address.is_link_local
+
+
+class ProxyPool:
+    """
+    Proxy health service shared through Redis.
+
+    The refresh_proxy_pool beat task tests known and newly listed proxies in the background.
+    Every use of a proxy also feeds its success rate and latency into its score. Fetches never
+    wait for proxy discovery: they pick from the best-scored proxies by weighted choice. Each
+    host sticks to its proxy until that proxy fails, so a site sees one consistent client.
+    """
+
+    KEY_PREFIX = "gd:proxy"
+
+    def __init__(self, redis=None) -> None:
+        self.redis = redis or settings.REDIS_CONN
+        self.scores_key = f"{self.KEY_PREFIX}:scores"
+        self.list_url = settings.PROXY_LIST_URL
+        self.test_url = settings.PROXY_TEST_URL
+        self.test_timeout = settings.PROXY_TEST_TIMEOUT
+        self.test_workers = settings.PROXY_TEST_WORKERS
+        self.max_candidates = settings.PROXY_MAX_CANDIDATES
+        self.choice_size = settings.PROXY_CHOICE_SIZE
+        self.sticky_ttl = settings.PROXY_STICKY_TTL
+        self.min_samples = settings.PROXY_MIN_SAMPLES
+        self.min_success_rate = settings.PROXY_MIN_SUCCESS_RATE
+        self.stats_ttl = settings.PROXY_STATS_TTL
+
+        self._record_script = self.redis.register_script(RECORD_SCRIPT)
+
+    def _stats_key(self, proxy: str) -> str:
+        return f"{self.KEY_PREFIX}:stats:{proxy}"
+
+    def _sticky_key(self, host: str) -> str:
+        return f"{self.KEY_PREFIX}:sticky:{host}"
+
+    def choose(self, host: str = None):
+        """
+        Returns a proxy address for a request to host, or None if no healthy proxy is known or
+        the host is local (such as the crawl fixture server)
+        """
+        if host and is_local_host(host):
+            return None
+
+        sticky_key = self._sticky_key(host) if host else None
+        if sticky_key:
+            proxy = self.redis.get(sticky_key)
+            if proxy and self.redis.zscore(self.scores_key, proxy):
+                self.redis.expire(sticky_key, self.sticky_ttl)
+                return proxy
+
+        candidates = self.redis.zrevrange(
+            self.scores_key, 0, self.choice_size - 1, withscores=True
+        )
+        if not candidates:
+            return None
+
+        proxies, weights = zip(*candidates)
+        proxy = random.choices(proxies, weights=weights)[0]
+        if sticky_key:
+            self.redis.set(sticky_key, proxy, ex=self.sticky_ttl)
+        return proxy
+
+    def as_requests_proxies(self, proxy):
+        """The proxies argument for requests/cloudscraper for a proxy address, or None"""
+        if not proxy:
+            return None
+        return {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+
+    def record(self, proxy, ok: bool, latency: float = 0, host: str = None) -> None:
+        """
+        Feeds one use of a proxy into its score. A failure also releases the host's sticky
+        assignment, so its next request picks another proxy.
+        """
+        if not proxy:
+            return
+
+        self._record_script(
+            keys=[self._stats_key(proxy), self.scores_key],
+            args=[
+                proxy,
+                1 if ok else 0,
+                latency,
+                time.time(),
+                self.min_samples,
+                self.min_success_rate,
+                self.stats_ttl,
+            ],
+        )
+        if not ok and host and self.redis.get(self._sticky_key(host)) == proxy:
+            self.redis.delete(self._sticky_key(host))
+
+    def refresh(self) -> int:
+        """
+        Tests the pooled proxies and newly listed candidates in parallel and rescores them.
+        Returns the number of healthy proxies.
+        """
+        candidates = set(self.redis.zrange(self.scores_key, 0, -1))
+        candidates.update(self._list_candidates())
+        if not candidates:
+            logger.info("No proxy candidates to test")
+            return 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.test_workers) as executor:
+            results = dict(zip(candidates, executor.map(self._test, candidates)))
+
+        for proxy, latency in results.items():
+            self.record(proxy, latency is not None, latency or 0)
+
+        healthy = self.redis.zcard(self.scores_key)
+        logger.info(
+            f"Tested {len(results)} proxies, "
+            f"{sum(latency is not None for latency in results.values())} responded, "
+            f"{healthy} healthy in pool"
+        )
+        return healthy
+
+    def _list_candidates(self) -> list:
+        if not self.list_url:
+            return []
+        try:
+            response = get_http_session().get(self.list_url, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f"Error downloading proxy list: {e}")
+            return []
+
+        proxies = [line.strip() for line in response.text.splitlines() if line.strip()]
+        return proxies[: self.max_candidates]
+
+    def _test(self, proxy: str):
+        """Latency of a test request through the proxy, or None if it failed"""
+        try:
+            response = get_http_session().get(
+                self.test_url,
+                proxies=self.as_requests_proxies(proxy),
+                timeout=self.test_timeout,
+            )
+            if response.status_code == 200:
+                return response.elapsed.total_seconds()
+        except requests.RequestException:
+            pass
+        return None
@@ -0,0 +1,143 @@
+import re
+from urllib.parse import unquote, urlparse
+
+from detective.models import SustainabilityGlossary
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Longest glossary phrase, in words, matched against path and anchor text
+MAX_PHRASE_LENGTH = 4
+
+# Words in a path or anchor that point at sustainability disclosures
+RELEVANT_TERMS = {
+    "sustainability": 3.0,
+    "sustainable": 3.0,
+    "esg": 3.0,
+    "climate": 3.0,
+    "carbon": 3.0,
+    "emissions": 3.0,
+    "ghg": 3.0,
+    "net zero": 3.0,
+    "netzero": 3.0,
+    "environment": 2.5,
+    "environmental": 2.5,
+    "impact": 2.0,
+    "responsibility": 2.0,
+    "csr": 2.0,
+    "renewable": 2.0,
+    "energy": 1.5,
+    "green": 1.5,
+    "recycling": 1.5,
+    "waste": 1.5,
+    "water": 1.0,
+    "biodiversity": 1.5,
+    "social": 1.0,
+    "governance": 1.0,
+    "report": 1.0,
+    "reports": 1.0,
+    "reporting": 1.0,
+    "commitments": 1.0,
+    "policy": 0.5,
+    "about": 0.5,
+}
+
+# Pages that rarely carry claims and would otherwise eat into the link budget
+LOW_VALUE_TERMS = {
+    "login",
+    "signin",
+    "signup",
+    "register",
+    "account",
+    "cart",
+    "checkout",
+    "basket",
+    "careers",
+    "jobs",
+    "vacancies",
+    "cookie",
+    "cookies",
+    "privacy",
+    "terms",
+    "legal",
+    "tag",
+    "tags",
+    "author",
+    "search",
+    "feed",
+    "rss",
+    "page",
+}
+
+ANCHOR_WEIGHT = 1.5
+GLOSSARY_WEIGHT = 2.0
+LOW_VALUE_PENALTY = 3.0
+DEPTH_PENALTY = 0.25
+QUERY_PENALTY = 0.5
+PDF_BONUS = 1.0
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(unquote(text or "").lower())
+
+
+def phrases(tokens: list) -> set:
+    """All word n-grams up to MAX_PHRASE_LENGTH, joined by spaces"""
+    found = set()
+    for length in range(1, MAX_PHRASE_LENGTH + 1):
+        for i in range(len(tokens) - length + 1):
+            found.add(" ".join(tokens[i : i + length]))
+    return found
+
+
+class RelevanceScorer:
+    """
+    Scores candidate URLs by how likely they are to hold sustainability claims, so the crawl
+    frontier spends its link budget on the best pages first.
+
+    A URL scores for sustainability words and glossary terms in its path and in the anchor
+    text linking to it, and loses score for account, legal and listing pages, for depth and
+    for query strings. Shallow pages still win ties, so the crawl stays close to
+    breadth-first where nothing stands out.
+    """
+
+    def __init__(self, glossary_terms=()) -> None:
+        self.glossary_terms = set()
+        for term in glossary_terms:
+            tokens = tokenize(term)
+            if tokens and len(tokens) <= MAX_PHRASE_LENGTH:
+                self.glossary_terms.add(" ".join(tokens))
+
+    @classmethod
+    def from_glossary(cls) -> "RelevanceScorer":
+        terms = SustainabilityGlossary.objects.filter(defunct=False).values_list(
+            "term", flat=True
+        )
+        return cls(terms)
+
+    def score(self, url: str, anchor_text: str = "") -> float:
+        parsed = urlparse(url)
+        path_tokens = tokenize(parsed.path)
+        path_phrases = phrases(path_tokens)
+        anchor_phrases = phrases(tokenize(anchor_text))
+
+        score = self._term_score(path_phrases)
+        score += ANCHOR_WEIGHT * self._term_score(anchor_phrases)
+
+        if any(token in LOW_VALUE_TERMS for token in path_tokens):
+            score -= LOW_VALUE_PENALTY
+        if parsed.path.lower().endswith(".pdf") and score > 0:
+            # Relevant PDFs are usually the sustainability report itself
+            score += PDF_BONUS
+        if parsed.query:
+            score -= QUERY_PENALTY
+
+        depth = len([segment for segment in parsed.path.split("/") if segment])
+        score -= DEPTH_PENALTY * depth
+        return round(score, 3)
+
+    def _term_score(self, found: set) -> float:
+        if not found:
+            return 0.0
+        score = sum(RELEVANT_TERMS.get(phrase, 0.0) for phrase in found)
+        score += GLOSSARY_WEIGHT * len(found & self.glossary_terms)
+        return score
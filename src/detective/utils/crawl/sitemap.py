@@ -0,0 +1,150 @@
+import gzip
+import io
+import logging
+import xml.etree.ElementTree as ET
+from datetime import timezone
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+from dateutil.parser import isoparse
+from django.conf import settings
+
+from detective.utils.crawl.http_client import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# sitemaps.org caps an uncompressed sitemap at 50MB
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+
+
+class SitemapDiscovery:
+    """
+    Discovers a site's pages from robots.txt and its sitemaps.
+
+    Sitemaps listed in robots.txt (or /sitemap.xml if it lists none) are read with
+    sitemap indexes followed and gzipped sitemaps decompressed. Every page robots.txt allows
+    is returned with its lastmod date, so the frontier can be seeded in bulk and unchanged
+    pages left out of re-crawls.
+    """
+
+    def __init__(self, start_url: str, headers: dict = None) -> None:
+        if not start_url.startswith("http"):
+            start_url = "https://" + start_url
+        parsed = urlparse(start_url)
+        self.root = f"{parsed.scheme}://{parsed.netloc}"
+        self.headers = headers or {}
+        self.user_agent = self.headers.get("User-Agent", "*")
+        self.max_urls = settings.CRAWL_SITEMAP_MAX_URLS
+        self.max_sitemaps = settings.CRAWL_SITEMAP_MAX_FILES
+        self.timeout = settings.CRAWL_REQUEST_TIMEOUT
+        self.robots = RobotFileParser()
+
+    def discover(self) -> dict:
+        """
+        Returns {url: lastmod} for the pages listed in the site's sitemaps. lastmod is an aware
+        datetime, or None where the sitemap does not give one.
+        """
+        pending = self._read_robots() or [urljoin(self.root, "/sitemap.xml")]
+        fetched = set()
+        pages = {}
+
+        while pending and len(fetched) < self.max_sitemaps and len(pages) < self.max_urls:
+            sitemap_url = pending.pop(0)
+            if sitemap_url in fetched:
+                continue
+            fetched.add(sitemap_url)
+
+            content = self._fetch(sitemap_url)
+            if not content:
+                continue
+
+            for kind, loc, lastmod in self._parse(content, sitemap_url):
+                if kind == "sitemap":
+                    pending.append(loc)
+                elif self.robots.can_fetch(self.user_agent, loc):
+                    if loc not in pages or (lastmod and (not pages[loc] or lastmod > pages[loc])):
+                        pages[loc] = lastmod
+                    if len(pages) >= self.max_urls:
+                        break
+
+        logger.info(
+            f"Sitemap discovery for {self.root}: {len(pages)} pages from {len(fetched)} sitemaps"
+        )
+        return pages
+
+    def _read_robots(self) -> list:
+        """
+        Loads robots.txt rules and returns the sitemaps it lists. A missing or unreadable
+        robots.txt allows everything.
+        """
+        content = self._fetch(urljoin(self.root, "/robots.txt"))
+        lines = content.decode("utf-8", errors="ignore").splitlines() if content else []
+        self.robots.parse(lines)
+        return self.robots.site_maps() or []
+
+    def _fetch(self, url: str):
+        try:
+            with get_http_session().get(
+                url, headers=self.headers, timeout=self.timeout, stream=True
+            ) as response:
+                if response.status_code != 200:
+                    logger.info(f"Got status code {response.status_code} for {url}")
+                    return None
+                content = response.raw.read(MAX_SITEMAP_BYTES + 1, decode_content=True)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            return None
+
+        # .xml.gz sitemaps are usually served as application/gzip rather than content-encoded
+        if content[:2] == b"\x1f\x8b":
+            try:
+                with gzip.GzipFile(fileobj=io.BytesIO(content)) as compressed:
+                    content = compressed.read(MAX_SITEMAP_BYTES + 1)
+            except (OSError, EOFError) as e:
+                logger.warning(f"Failed to decompress {url}: {e}")
+                return None
+
+        if len(content) > MAX_SITEMAP_BYTES:
+            logger.warning(f"{url} exceeds {MAX_SITEMAP_BYTES} bytes; reading the first part")
+            content = content[:MAX_SITEMAP_BYTES]
+        return content
+
+    def _parse(self, content: bytes, sitemap_url: str):
+        """
+        Yields ("url" | "sitemap", loc, lastmod) entries from an XML sitemap or sitemap index,
+        or from a plain-text sitemap with one URL per line.
+        """
+        if not content.lstrip().startswith(b"<"):
+            for line in content.decode("utf-8", errors="ignore").splitlines():
+                if line.strip().startswith("http"):
+                    yield "url", line.strip(), None
+            return
+
+        try:
+            for _, element in ET.iterparse(io.BytesIO(content)):
+                kind = element.tag.rsplit("}", 1)[-1]
+                if kind not in ("url", "sitemap"):
+                    continue
+
+                loc = lastmod = None
+                for child in element:
+                    name = child.tag.rsplit("}", 1)[-1]
+                    if name == "loc":
+                        loc = (child.text or "").strip()
+                    elif name == "lastmod":
+                        lastmod = self._parse_lastmod(child.text)
+                if loc:
+                    yield kind, urljoin(sitemap_url, loc), lastmod
+                element.clear()
+        except ET.ParseError as e:
+            logger.warning(f"Failed to parse sitemap {sitemap_url}: {e}")
+
+    def _parse_lastmod(self, value: str):
+        try:
+            lastmod = isoparse((value or "").strip())
+        except ValueError:
+            return None
+        if lastmod.tzinfo is None:
+            lastmod = lastmod.replace(tzinfo=timezone.utc)
+        return lastmod
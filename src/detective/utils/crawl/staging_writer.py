@@ -0,0 +1,97 @@
+import logging
+
+
+from detective.models import Staging
+
+logger = logging.getLogger(__name__)
+
+# Columns of an existing row that a newer copy of the same page chunk overwrites
+UPDATE_FIELDS = [
+    "url",
+    "raw",
+    "processed",
+    "defunct",
+    "etag",
+    "last_modified",
+    "content_hash",
+    "duplicate_of",
+    "updated_at",
+]
+
+
+def _row_key(staging: Staging) -> tuple:
+    return (staging.company_id, staging.url_hash, staging.chunk)
+
+
+def write_staging(rows: list) -> list:
+    """
+    Inserts a page's new Staging rows with one bulk_create, rather than a round trip and a
+    commit per chunk. Returns the rows that were saved, in order, each with the primary key it
+    has in the database.
+
+    A row that collides with an existing one on (company, url_hash, chunk), e.g. because
+    another worker staged the same page at the same time, overwrites it. If the insert fails,
+    the rows are saved one at a time so one bad row does not lose the page.
+    """
+    if not rows:
+        return []
+    for row in rows:
+        # bulk_create does not call save(), which fills in the hash
+        row.url_hash = Staging.hash_url(row.url)
+
+    # One statement cannot upsert the same row twice, so only the newest copy of a page chunk
+    # is written
+    rows = list({_row_key(row): row for row in rows}.values())
+    try:
+        Staging.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["company", "url_hash", "chunk"],
+            update_fields=UPDATE_FIELDS,
+        )
+        saved = _persisted(rows)
+    except Exception as e:
+        logger.warning(f"Batch insert of {len(rows)} rows failed, saving one by one: {e}")
+        saved = _save_each(rows)
+    logger.info(f"Saved {len(saved)} rows to staging")
+    return [row for row in rows if _row_key(row) in saved]
+
+
+def _persisted(rows) -> dict:
+    """
+    Maps each row's key to the row with the primary key it has in the database. A row that
+    overwrote an existing one keeps that row's uuid, not the one generated for it.
+    """
+    uuids = {}
+    for company_id in {row.company_id for row in rows}:
+        hashes = {row.url_hash for row in rows if row.company_id == company_id}
+        persisted = Staging.objects.filter(
+            company_id=company_id, url_hash__in=hashes
+        ).values_list("url_hash", "chunk", "uuid")
+        uuids.update(((company_id, url_hash, chunk), uuid) for url_hash, chunk, uuid in persisted)
+
+    saved = {}
+    for row in rows:
+        key = _row_key(row)
+        if key in uuids:
+            row.uuid = uuids[key]
+            saved[key] = row
+    return saved
+
+
+def _save_each(rows) -> dict:
+    saved = {}
+    for row in rows:
+        try:
+            persisted, _ = Staging.objects.update_or_create(
+                company_id=row.company_id,
+                url_hash=row.url_hash,
+                chunk=row.chunk,
+                defaults={field: getattr(row, field) for field in UPDATE_FIELDS},
+            )
+        except Exception as e:
+            logger.error(f"Failed to save {row.url} to staging: {e}")
+            continue
+        row.uuid = persisted.uuid
+        saved[_row_key(row)] = row
+    return saved
@@ -0,0 +1,118 @@
+import hashlib
+import math
+
+
+def url_hash(url: str) -> bytes:
+    """128-bit digest of a URL; the first 64 bits are its fingerprint"""
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+
+def url_fingerprint(url: str) -> int:
+    """64-bit URL fingerprint"""
+    return int.from_bytes(url_hash(url)[:8], "big")
+
+
+def bloom_parameters(capacity: int, error_rate: float):
+    """
+    Returns the optimal (number of bits, number of hashes) for a Bloom filter holding capacity
+    items with the given false-positive rate.
+    """
+    capacity = max(capacity, 1)
+    num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    return num_bits, num_hashes
+
+
+def bloom_positions(url: str, num_bits: int, num_hashes: int) -> list:
+    """
+    Bit positions for a URL, derived from two 64-bit halves of one digest (Kirsch-Mitzenmacher)
+    """
+    digest = url_hash(url)
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:], "big") | 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over URLs. Membership tests have no false negatives and a
+    false-positive rate of at most error_rate while no more than capacity URLs are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits, self.num_hashes = bloom_parameters(capacity, error_rate)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def __contains__(self, url: str) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7))
+            for pos in bloom_positions(url, self.num_bits, self.num_hashes)
+        )
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, url: str) -> bool:
+        """
+        Adds a URL. Returns False if it was (probably) present already.
+        """
+        added = False
+        for pos in bloom_positions(url, self.num_bits, self.num_hashes):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows as URLs are added (Almeida et al., 2007).
+
+    Each new stage is `growth` times larger with a false-positive rate tightened by
+    `tightening`, so the compound false-positive rate stays below error_rate however many URLs
+    are added, and memory grows with the number of URLs rather than their length.
+    """
+
+    def __init__(
+        self,
+        initial_capacity: int = 1024,
+        error_rate: float = 0.001,
+        growth: int = 2,
+        tightening: float = 0.5,
+    ) -> None:
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        # The stage rates form a geometric series that sums to error_rate
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - tightening))]
+
+    def __contains__(self, url: str) -> bool:
+        return any(url in bloom for bloom in self.filters)
+
+    def __len__(self) -> int:
+        return sum(len(bloom) for bloom in self.filters)
+
+    def add(self, url: str) -> bool:
+        """
+        Adds a URL. Returns False if it was (probably) present already.
+        """
+        if url in self:
+            return False
+
+        current = self.filters[-1]
+        if len(current) >= current.capacity:
+            current = BloomFilter(
+                current.capacity * self.growth, current.error_rate * self.tightening
+            )
+            self.filters.append(current)
+        return current.add(url)
+
+    @property
+    def size_in_bytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.filters)
@@ -0,0 +1,167 @@
+import gzip
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Headers describing the transfer rather than the page. Bodies are recorded decoded, so these
+# would no longer match them.
+TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def _warc_date() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class WarcRecorder:
+    """
+    Writes the responses of a crawl to a gzipped WARC file, one gzip member per record, so a
+    crawl of a real site can be served again by the crawl fixture server and benchmarked
+    offline.
+
+    Bodies are recorded decoded (as the crawler saw them), so the recorded Content-Encoding and
+    Content-Length headers are dropped and Content-Length is recomputed. Redirects are recorded
+    as responses of their own, so the fixture server redirects the same way.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.records = 0
+        # The crawl engine records from its thread pool
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+        self._write_record(
+            "warcinfo",
+            None,
+            "application/warc-fields",
+            b"software: green-detective\r\nformat: WARC File Format 1.1\r\n",
+        )
+
+    @classmethod
+    def for_crawl(cls, directory: str, start_url: str) -> "WarcRecorder":
+        """
+        A recorder writing to a new file in directory, named after the crawled host. Each crawl
+        task writes its own file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        host = urlparse(start_url).netloc.replace(":", "_") or "crawl"
+        name = f"{host}-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}.warc.gz"
+        return cls(os.path.join(directory, name))
+
+    def _write_record(self, warc_type: str, url, content_type: str, block: bytes) -> None:
+        headers = [
+            "WARC/1.1",
+            f"WARC-Type: {warc_type}",
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+            f"WARC-Date: {_warc_date()}",
+        ]
+        if url:
+            headers.append(f"WARC-Target-URI: {url}")
+        headers.append(f"Content-Type: {content_type}")
+        headers.append(f"Content-Length: {len(block)}")
+        record = "\r\n".join(headers).encode("utf-8") + b"\r\n\r\n" + block + b"\r\n\r\n"
+        member = gzip.compress(record, compresslevel=6)
+        with self._lock:
+            self._file.write(member)
+
+    def record(self, url: str, status_code: int, headers, content: bytes, reason="") -> None:
+        """
+        Records one response. headers is a mapping or a list of (name, value) pairs.
+        """
+        items = headers.multi_items() if hasattr(headers, "multi_items") else headers
+        items = items.items() if hasattr(items, "items") else items
+        lines = [f"HTTP/1.1 {status_code} {reason or ''}".rstrip()]
+        lines.extend(
+            f"{name}: {value}" for name, value in items if name.lower() not in TRANSFER_HEADERS
+        )
+        lines.append(f"Content-Length: {len(content)}")
+        block = "\r\n".join(lines).encode("utf-8", errors="replace") + b"\r\n\r\n" + content
+        try:
+            self._write_record("response", url, "application/http;msgtype=response", block)
+            self.records += 1
+        except OSError as e:
+            logger.warning(f"Could not record {url} to {self.path}: {e}")
+
+    def record_response(self, url: str, response) -> None:
+        """
+        Records a response of the crawl engine or the Scraper's bypass chain, with the
+        redirects that led to it
+        """
+        for redirect in getattr(response, "history", None) or []:
+            self.record(
+                str(redirect.url),
+                redirect.status_code,
+                redirect.headers,
+                b"",
+                getattr(redirect, "reason_phrase", None) or getattr(redirect, "reason", ""),
+            )
+        self.record(
+            str(getattr(response, "url", "") or url),
+            response.status_code,
+            getattr(response, "headers", None) or {},
+            response.content,
+            getattr(response, "reason_phrase", None) or getattr(response, "reason", ""),
+        )
+
+    def close(self) -> None:
+        self._file.close()
+        logger.info(f"Recorded {self.records} responses to {self.path}")
+
+
+class WarcResponse:
+    """A response record read back from a WARC file"""
+
+    def __init__(self, url: str, status_code: int, headers: list, content: bytes) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+def _read_headers(stream) -> list:
+    lines = []
+    while True:
+        line = stream.readline()
+        if not line:
+            raise EOFError
+        line = line.rstrip(b"\r\n")
+        if not line:
+            return lines
+        lines.append(line.decode("utf-8", errors="replace"))
+
+
+def read_warc(path: str):
+    """
+    Yields the response records of a (gzipped or plain) WARC file as WarcResponse
+    """
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    with (gzip.open if gzipped else open)(path, "rb") as stream:
+        while True:
+            try:
+                lines = _read_headers(stream)
+            except EOFError:
+                return
+            if not lines:
+                continue
+            fields = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                fields[name.strip().lower()] = value.strip()
+            block = stream.read(int(fields.get("content-length", 0)))
+
+            if fields.get("warc-type") != "response" or not block.startswith(b"HTTP/"):
+                continue
+            head, _, content = block.partition(b"\r\n\r\n")
+            status_line, *header_lines = head.decode("utf-8", errors="replace").split("\r\n")
+            parts = status_line.split(" ", 2)
+            headers = []
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers.append((name.strip(), value.strip()))
+            yield WarcResponse(fields.get("warc-target-uri", ""), int(parts[1]), headers, content)
@@ -1,30 +1,80 @@
 import requests
-import concurrent.futures
 import time
 import logging
-from bs4 import BeautifulSoup
 from datetime import timedelta
 from django.utils import timezone
-from urllib.parse import urljoin, urlparse, urlunparse
-from detective.models import Staging, Company
+from urllib.parse import urljoin, urlparse
+from detective.models import Staging, Company, RawStatistics
 import PyPDF2 as pypdf
-import io
+import tempfile
 import re
+import hashlib
 from django.conf import settings
-from rq import Queue
-from tenacity import retry, stop_after_attempt, wait_exponential
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from ratelimit import limits, sleep_and_retry
+from collections import OrderedDict
 import random
 import os
-import cloudscraper
-import undetected_chromedriver as uc
+import threading
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from random import choice
-from functools import lru_cache
+from detective.utils.crawl.boilerplate import BoilerplateFilter
+from detective.utils.crawl.browser_pool import get_browser_pool
+from detective.utils.crawl.bypass import BypassMemory
+from detective.utils.crawl.canonical import CanonicalUrls, canonicalize_url
+from detective.utils.crawl.duplicates import DuplicateIndex
+from detective.utils.crawl.engine import FALLBACK_STATUS_CODES
+from detective.utils.crawl.extraction import extract_page
+from detective.utils.crawl.fetch_cache import FetchCache, FetchCacheMiss
+from detective.utils.crawl.http_client import (
+    ResponseTooLarge,
+    get_cloudscraper,
+    get_http_session,
+    iter_limited,
+)
+from detective.utils.crawl.proxies import ProxyPool
+from detective.utils.crawl.staging_writer import write_staging
+from detective.utils.crawl.host_limiter import (
+    THROTTLE_STATUS_CODES,
+    HostRateLimiter,
+    HostUnavailable,
+)
+
+
+# Anti-bot interstitials served in place of the page
+CHALLENGE_BYTES_PATTERN = re.compile(rb"Verifying your connection|Security check", re.I)
+
+# Pages that are empty shells filled in by JavaScript: a "please enable JavaScript" notice or
+# an empty single-page-app mount point
+JS_SHELL_PATTERN = re.compile(
+    rb"<noscript[^>]*>[^<]*(?:enable|requires?|turn on)[^<]*javascript"
+    rb"|<div[^>]+id=[\"'](?:root|app|__next)[\"'][^>]*>\s*</div>",
+    re.I,
+)
+
+# URLs that name a document a browser would download rather than render
+DOCUMENT_EXTENSIONS = (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".csv", ".txt")
+
+# Fetch methods in order of cost, as remembered per host by BypassMemory
+REGULAR_REQUEST = "regular_request"
+CLOUDSCRAPER = "cloudscraper"
+SELENIUM = "selenium"
+FETCH_METHODS = [REGULAR_REQUEST, CLOUDSCRAPER, SELENIUM]
+
+
+class SeleniumResponse:
+    """Minimal response wrapper for a page rendered in a pooled browser"""
+
+    def __init__(self, page_source):
+        self.text = page_source
+        self.content = page_source.encode("utf-8")
+        self.status_code = 200
+        self.headers = {"Content-Type": "text/html; charset=utf-8"}
+
+
+_contexts = OrderedDict()
+_contexts_pid = None
+_contexts_lock = threading.Lock()
 
 
 class Scraper:
@@ -34,60 +84,74 @@ class Scraper:
 
     MAX_LINKS = int(os.getenv("MAX_LINKS", "30000"))
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", "15000"))
+    ANCHOR_TEXT_MAX_LENGTH = 200
+    REQUEST_ATTEMPTS = 3
+    MAX_PDF_PAGES = 100
 
-    def __init__(self, company_id, start_url, urls_to_process=None):
+    def __init__(self, company_id, start_url):
         self.company = Company.objects.get(uuid=company_id)
         self.start_url = start_url
         self.domain = urlparse(start_url).netloc
-        self.visited = set()
-        self.to_visit = {start_url}
-        self.urls_to_process = urls_to_process
         self.max_links = self.MAX_LINKS
         self.max_content_length = self.MAX_CONTENT_LENGTH
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        self.total_links_available = 0
-        self.request_count = 0
-        self.last_request_time = time.time()
-
+        self.created_at = time.monotonic()
         self.logger = logging.getLogger(__name__)
         self.redis = settings.REDIS_CONN
-        self.scrape_queue = Queue("scraping", connection=self.redis)
+        self.host_limiter = HostRateLimiter(self.redis)
+        # Fetch methods that got through to each host recently are tried first
+        self.bypass = BypassMemory(self.redis)
+        # Raw responses are kept for re-processing, and served from here in replay mode
+        self.fetch_cache = FetchCache()
 
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             # Add more user agents here
         ]
 
-        # Initialize cloudscraper
-        self.scraper = cloudscraper.create_scraper(
-            browser={"browser": "chrome", "platform": "windows", "mobile": False}, delay=10
-        )
+        # Keep-alive sessions shared by every Scraper in this worker process
+        self.session = get_http_session()
+        self.scraper = get_cloudscraper()
 
-        # Initialize undetected-chromedriver for JavaScript-heavy sites
-        self.driver = None
-
-        self.proxy_pool = []
-        self.current_proxy_index = 0
-        self._initialize_proxy_pool()
-
-        self.proxy_cache = {}  # Cache for working proxies
-        self.proxy_timeout = 5  # Timeout for proxy testing
-        self.max_parallel_proxy_tests = 20  # Max parallel proxy tests
-        self.proxy_refresh_interval = 300  # Refresh proxy list every 5 minutes
-        self.last_proxy_refresh = 0
-
-    def _initialize_proxy_pool(self):
-        """Initialize a pool of proxies"""
-        # Add your proxy list here
-        proxy_list = [
-            {"username": "user1", "password": "pass1", "host": "proxy1.com", "port": "8080"},
-            {"username": "user2", "password": "pass2", "host": "proxy2.com", "port": "8080"},
-            # Add more proxies
-        ]
+        # Proxies are tested and scored in the background by the refresh_proxy_pool task
+        self.proxies = ProxyPool(self.redis)
 
-        self.proxy_pool = proxy_list
+        # Navigation, footers and banners repeated across the site's pages are left out
+        self.boilerplate = BoilerplateFilter(self.domain, self.redis)
+        # Near-duplicate pages are linked to the first copy instead of being analysed again
+        self.duplicates = DuplicateIndex(self.company.uuid, self.redis)
+        # Redirects and rel=canonical links seen on the site, so aliases are fetched once
+        self.canonical_urls = CanonicalUrls(self.company.uuid, self.redis)
+
+    @classmethod
+    def for_company(cls, company_id, start_url):
+        """
+        Returns this worker process's Scraper for the company's domain, creating it on first
+        use. The company row and sessions are reused across tasks
+        until the context is older than SCRAPER_CONTEXT_TTL or evicted by newer domains.
+        """
+        global _contexts_pid
+        key = (str(company_id), urlparse(start_url).netloc)
+
+        with _contexts_lock:
+            if _contexts_pid != os.getpid():
+                _contexts.clear()
+                _contexts_pid = os.getpid()
+
+            scraper = _contexts.get(key)
+            if scraper and time.monotonic() - scraper.created_at < settings.SCRAPER_CONTEXT_TTL:
+                _contexts.move_to_end(key)
+                return scraper
+
+        scraper = cls(company_id, start_url)
+        with _contexts_lock:
+            _contexts[key] = scraper
+            _contexts.move_to_end(key)
+            while len(_contexts) > settings.SCRAPER_CONTEXT_SIZE:
+                _contexts.popitem(last=False)
+        return scraper
 
     def scrape_about_section(self):
         try:
@@ -102,12 +166,13 @@ class Scraper:
             if not about_url.startswith("http"):
                 about_url = "https://" + about_url
 
-            response = requests.get(about_url, headers=self.headers)
-            soup = BeautifulSoup(response.content, "html.parser")
-            texts = soup.stripped_strings
-            content = " ".join(texts)
-            content = self._clean_content(content)
-            return content
+            response = self.session.get(about_url, headers=self.headers)
+            page = extract_page(
+                response.content,
+                about_url,
+                content_type=response.headers.get("Content-Type", ""),
+            )
+            return self._page_text(page, about_url)
         except requests.RequestException as e:
             self.logger.error(f"Request failed: {e}")
             return ""
@@ -142,11 +207,18 @@ class Scraper:
         text_content = text_content.strip()
         return text_content
 
-    def _pdf_contains_images(self, pdf_io_bytes):
-        reader = pypdf.PdfReader(pdf_io_bytes, strict=True)
+    def _page_text(self, page, url):
+        """
+        Cleaned text of an extracted page, without the blocks repeated across the site
+        """
+        if page.challenge:
+            # Challenge pages would teach the filter the challenge rather than the site
+            return self._clean_content(page.text)
+        return self._clean_content(self.boilerplate.strip(url, page.blocks))
+
+    def _pdf_contains_images(self, reader):
         if len(reader.pages) <= 2:
-            for i in range(len(reader.pages)):
-                page = reader.pages[i]
+            for page in reader.pages:
                 if "/XObject" in page["/Resources"]:
                     xObject = page["/Resources"]["/XObject"].get_object()
                     for obj in xObject:
@@ -160,92 +232,254 @@ class Scraper:
             self.logger.info("PDF has more than 2 pages")
         return False
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def _scrape_content(self, url):
+    def _iter_pdf_text(self, reader):
+        """
+        Yields the cleaned text of each page of a PDF, extracting one page at a time
+        """
+        for page in reader.pages:
+            text = self._clean_content((page.extract_text() or "").replace("\x00", ""))
+            if text:
+                yield text
+
+    def _limited_request(self, get, url, **kwargs):
+        """
+        Makes a request with get() through the host's adaptive rate limit. Throttled and failed
+        requests are retried once the limiter allows another request to the host. Raises
+        HostUnavailable if the host is paused for longer than CRAWL_HOST_MAX_WAIT.
+        """
+        host = urlparse(url).netloc
+        for attempt in range(1, self.REQUEST_ATTEMPTS + 1):
+            self.host_limiter.acquire(host)
+            started = time.monotonic()
+            try:
+                response = get(url, **kwargs)
+            except requests.RequestException:
+                self.host_limiter.record(host, None, time.monotonic() - started)
+                if attempt == self.REQUEST_ATTEMPTS:
+                    raise
+                continue
+
+            self.host_limiter.record(
+                host,
+                response.status_code,
+                time.monotonic() - started,
+                response.headers.get("Retry-After"),
+            )
+            if response.status_code not in THROTTLE_STATUS_CODES:
+                return response
+            if attempt < self.REQUEST_ATTEMPTS:
+                # A streamed response holds its pooled connection until it is closed
+                response.close()
+        return response
+
+    def _fetch_content(self, url, staged=None):
+        """
+        Fetches a document with the cheapest method that works, revalidating against its staged
+        copy if given. Everything starts as a plain request on the pooled session. Blocked or
+        challenged pages are retried through cloudscraper, and HTML that is still blocked or
+        only renders with JavaScript goes to a pooled browser; PDFs and other documents are
+        never rendered, and PDFs are streamed to a temporary file (see _read_body). On hosts
+        where the cheaper methods have been failing, the fetch starts with the method that got
+        through recently. A host that keeps throttling raises HostUnavailable rather than being
+        escalated. Returns the response, or None when the server reports the document unchanged.
+        Parsing is left to the gd_parse workers (see _parse_content).
+        """
+        if self.fetch_cache.replay:
+            return self._replay(url)
+
+        conditional_headers = self._conditional_headers(staged)
+        host = urlparse(url).netloc
+        # Methods that keep failing on the host are skipped, up to the one that gets through
+        start = FETCH_METHODS.index(self.bypass.order(host, FETCH_METHODS)[0])
+        if urlparse(url).path.lower().endswith(DOCUMENT_EXTENSIONS):
+            start = min(start, FETCH_METHODS.index(CLOUDSCRAPER))
+
         try:
-            proxy = self._get_proxy()
-            response = self.scraper.get(url, proxies=proxy)
-            soup = BeautifulSoup(response.content, "html.parser")
-            texts = soup.stripped_strings
-            content = " ".join(texts)
-            content = self._clean_content(content)
-            return self._split_and_return_content(url, content)
+            response = None
+            if start == 0:
+                response = self._fetch_with(
+                    self.session.get, url, {**self.headers, **conditional_headers}
+                )
+                self._defer_if_throttled(host, response)
+                if response.status_code == 304:
+                    return None
+                self.bypass.record(host, REGULAR_REQUEST, not self._is_blocked(response))
+            if start <= 1 and (response is None or self._is_blocked(response)):
+                self.logger.info(f"Fetching {url} through cloudscraper")
+                # cloudscraper sends the headers that match its browser fingerprint
+                response = self._fetch_with(self.scraper.get, url, conditional_headers)
+                self._defer_if_throttled(host, response)
+                if response.status_code == 304:
+                    return None
+                self.bypass.record(host, CLOUDSCRAPER, not self._is_blocked(response))
+
+            if response is not None and self._is_document(url, response):
+                self._cache_response(url, response)
+                return response
+            if (
+                response is None
+                or self._is_blocked(response)
+                or JS_SHELL_PATTERN.search(response.content)
+            ):
+                self.logger.info(f"Rendering {url} in a browser")
+                self.host_limiter.acquire(host)
+                response = self._try_selenium(url)
+                self.bypass.record(host, SELENIUM, not self._is_blocked(response))
+            self._cache_response(url, response)
+            return response
+        except HostUnavailable:
+            raise
         except Exception as e:
             self.logger.error(f"Failed to scrape {url}: {e}")
             raise
 
-    def _scrape_html_content(self, url):
-        try:
-            response = requests.get(url, headers=self.headers)
-            soup = BeautifulSoup(response.content, "html.parser")
-            texts = soup.stripped_strings
-            content = " ".join(texts)
-            content = self._clean_content(content)
-            return self._split_and_return_content(url, content)
-        except requests.RequestException as e:
-            self.logger.error(f"Request failed: {e}")
-            return [(url, "")]
-        except Exception as e:
-            self.logger.error(f"Failed to parse HTML content from {url}: {e}")
-            return [(url, "")]
-
-    def _scrape_pdf_content(self, url):
-        try:
-            # Add verify=False to bypass SSL certificate verification
-            response = requests.get(url, headers=self.headers, verify=False)
+    def _defer_if_throttled(self, host, response):
+        """
+        Raises HostUnavailable for a host that is still throttling once the rate-limited
+        retries are spent, so the fetch is tried again later instead of escalating to
+        cloudscraper or a browser. The limiter has already slowed the host down.
+        """
+        if response.status_code not in THROTTLE_STATUS_CODES:
+            return
+        response.close()
+        wait = self.host_limiter.paused_for(host) or settings.CRAWL_HOST_BREAKER_COOLDOWN
+        raise HostUnavailable(host, wait)
 
-            # Check if the content type is actually a PDF
-            content_type = response.headers.get("Content-Type", "")
-            if "application/pdf" not in content_type:
-                self.logger.error(f"Content at {url} is not a PDF. Skipping.")
-                return [(url, "")]
+    def _replay(self, url):
+        """
+        The cached response for a URL, in replay mode where no requests are made
+        """
+        response = self.fetch_cache.get(self._normalize_url(url))
+        if response is None:
+            raise FetchCacheMiss(f"{url} is not in the fetch cache")
+        return response
 
-            pdf_io_bytes = io.BytesIO(response.content)
+    def _cache_response(self, url, response):
+        if self.fetch_cache.enabled and not self.fetch_cache.replay:
+            if response.status_code == 200 and not self._is_blocked(response):
+                self.fetch_cache.put(self._normalize_url(url), response)
 
-            if self._pdf_contains_images(pdf_io_bytes):
-                self.logger.warning(
-                    f"PDF at {url} contains images and has 2 or fewer pages. Skipping."
-                )
-                return [(url, "")]
+    def _fetch_with(self, get, url, headers):
+        """
+        Fetches a URL with get() through the host's rate limit. Requests go direct; only a page
+        that blocks the direct request is tried again through one of the pooled proxies, and
+        the direct response is kept if the proxy does no better.
+        """
+        kwargs = {"headers": headers, "timeout": settings.CRAWL_REQUEST_TIMEOUT, "stream": True}
+        response = self._read_body(self._limited_request(get, url, **kwargs))
+        # A throttled host is waited out rather than evaded
+        if not self._is_blocked(response) or response.status_code in THROTTLE_STATUS_CODES:
+            return response
 
-            text_list = []
-            pdf = pypdf.PdfReader(pdf_io_bytes)
+        proxied = self._proxied_request(get, url, **kwargs)
+        if proxied is None:
+            return response
+        response.close()
+        return proxied
 
-            num_pages = len(pdf.pages)
+    def _read_body(self, response):
+        """
+        Reads the body of a streamed response within the limit for its type. A PDF is spooled
+        to a temporary file, kept in memory up to SCRAPER_PDF_SPOOL_BYTES and on disk beyond
+        it, and set as response.document, leaving response.content empty; anything else is
+        read into response.content.
+        """
+        chunks = iter_limited(response)
+        first = next(chunks, b"")
+        content_type = response.headers.get("Content-Type", "").lower()
+        if "application/pdf" not in content_type and first[:5] != b"%PDF-":
+            response._content = first + b"".join(chunks)
+            return response
 
-            if num_pages > 100:
-                self.logger.info(f"Skipping PDF with more than 100 pages: {url}")
-                return [(url, "")]
+        document = tempfile.SpooledTemporaryFile(max_size=settings.SCRAPER_PDF_SPOOL_BYTES)
+        try:
+            document.write(first)
+            for chunk in chunks:
+                document.write(chunk)
+        except BaseException:
+            document.close()
+            raise
+        document.seek(0)
+        response._content = b""
+        response.document = document
+        return response
 
-            for page in range(num_pages):
-                page_text = pdf.pages[page].extract_text()
-                page_text = page_text.replace("\x00", "")  # Remove NUL characters
-                text_list.append(page_text)
+    def _proxied_request(self, get, url, **kwargs):
+        """
+        Retries a blocked request through a pooled proxy. Returns the response if it got
+        through, otherwise None. Proxy failures count against the proxy, not the host's rate
+        limit.
+        """
+        host = urlparse(url).netloc
+        proxy = self.proxies.choose(host)
+        if proxy is None:
+            return None
 
-            text = "\n".join(text_list)
-            text = self._clean_content(text)
-            return self._split_and_return_content(url, text)
+        self.host_limiter.acquire(host)
+        started = time.monotonic()
+        try:
+            response = self._read_body(
+                get(url, proxies=self.proxies.as_requests_proxies(proxy), **kwargs)
+            )
         except requests.RequestException as e:
-            self.logger.error(f"Request failed: {e}")
-            return [(url, "")]
-        except Exception as e:
-            self.logger.error(f"Failed to extract PDF content from {url}: {e}")
-            return [(url, "")]
+            self.proxies.record(proxy, False, host=host)
+            self.logger.warning(f"Proxy {proxy} failed for {url}: {e}")
+            return None
+
+        if self._is_blocked(response):
+            self.proxies.record(proxy, False, host=host)
+            response.close()
+            return None
+        self.proxies.record(proxy, True, time.monotonic() - started)
+        return response
+
+    def _is_blocked(self, response):
+        """
+        The response is a block, throttle or anti-bot challenge rather than the document
+        """
+        return response.status_code in FALLBACK_STATUS_CODES or bool(
+            CHALLENGE_BYTES_PATTERN.search(response.content)
+        )
 
-    def _scrape_js_content(self, url):
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
+    def _is_document(self, url, response):
+        """
+        The response is a PDF or another non-HTML document, which a browser cannot render
+        """
+        content_type = response.headers.get("Content-Type", "").lower()
+        if content_type and "html" not in content_type or hasattr(response, "document"):
+            return True
+        return (
+            urlparse(url).path.lower().endswith(DOCUMENT_EXTENSIONS)
+            or response.content[:5] == b"%PDF-"
+        )
 
-        driver = webdriver.Chrome(options=options)
-        try:
-            driver.get(url)
-            content = driver.page_source
-            soup = BeautifulSoup(content, "html.parser")
-            return self._extract_content(soup)
-        finally:
-            driver.quit()
+    def _pdf_text(self, url, pdf_file):
+        """
+        Cleaned text of a PDF, or "" for PDFs that are skipped
+        """
+        pdf = pypdf.PdfReader(pdf_file)
+        if len(pdf.pages) > self.MAX_PDF_PAGES:
+            self.logger.info(f"Skipping PDF with more than {self.MAX_PDF_PAGES} pages: {url}")
+            return ""
+
+        if self._pdf_contains_images(pdf):
+            self.logger.warning(
+                f"PDF at {url} contains images and has 2 or fewer pages. Skipping."
+            )
+            return ""
+
+        return " ".join(self._iter_pdf_text(pdf))
+
+    def _parse_content(self, url, document, content_type=""):
+        """
+        Cleaned text of a fetched document, given as a binary file: PDFs page by page, anything
+        else as an HTML page
+        """
+        head = document.read(5)
+        document.seek(0)
+        if "application/pdf" in content_type or head == b"%PDF-":
+            return self._pdf_text(url, document)
+        return self._page_text(extract_page(document.read(), url, content_type=content_type), url)
 
     def _split_and_return_content(self, url, text):
         if len(text) <= self.max_content_length:
@@ -256,45 +490,144 @@ class Scraper:
             parts.append((url, part))
         return parts
 
-    def _save_to_staging(self, url, raw_html):
-        try:
-            Staging.objects.create(
-                company=self.company,
-                url=url,
-                raw=raw_html,
+    def _save_to_staging(self, parts, **fields):
+        """
+        Saves the (url, text) parts of a page as its chunks, in one insert. Returns the saved
+        rows.
+        """
+        rows = [
+            Staging(company=self.company, url=url, raw=raw_html, chunk=chunk, **fields)
+            for chunk, (url, raw_html) in enumerate(parts)
+            if raw_html
+        ]
+        return write_staging(rows)
+
+    def _get_staged(self, url):
+        """
+        Validators and last refresh time of the company's staged copy of a URL, if any
+        """
+        return (
+            self._staged_rows(url)
+            .order_by("-updated_at")
+            .values("etag", "last_modified", "content_hash", "updated_at")
+            .first()
+        )
+
+    def _staged_rows(self, url):
+        return Staging.objects.filter(company=self.company, url_hash=Staging.hash_url(url))
+
+    def _conditional_headers(self, staged):
+        headers = {}
+        if staged:
+            if staged["etag"]:
+                headers["If-None-Match"] = staged["etag"]
+            if staged["last_modified"]:
+                headers["If-Modified-Since"] = staged["last_modified"]
+        return headers
+
+    def _response_validators(self, response):
+        headers = getattr(response, "headers", None) or {}
+        return {
+            "etag": headers.get("ETag", "")[:255],
+            "last_modified": headers.get("Last-Modified", "")[:64],
+        }
+
+    def _save_page(self, url, text, staged=None, validators=None):
+        """
+        Stages the cleaned text of a page. If it matches the staged copy, the existing rows are
+        only refreshed so they are not sent for analysis again; changed pages replace their old
+        rows and statistics. A near-duplicate of another staged page is staged as a DUPLICATE
+        linked to that page, so it is not analysed again. Returns True if new content was
+        staged.
+        """
+        validators = validators or {}
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        if staged and staged["content_hash"] == content_hash:
+            self.logger.info(f"Content unchanged since last crawl: {url}")
+            self._refresh_staging(url, **validators)
+            return False
+
+        if staged:
+            stale_staging = self._staged_rows(url)
+            # Pages that duplicated the old text are analysed on their own again
+            Staging.objects.filter(duplicate_of__in=stale_staging).update(
+                processed=Staging.STATUS_PENDING, duplicate_of=None
             )
-            self.logger.info(f"Saved to staging: {url}")
-        except Exception as e:
-            self.logger.error(f"Failed to save to staging: {e}")
-
-    def _get_driver(self):
-        """Lazy initialization of the Chrome driver"""
-        if self.driver is None:
-            options = uc.ChromeOptions()
-            options.add_argument("--headless")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--window-size=1920,1080")
-            options.add_argument("--disable-blink-features=AutomationControlled")
-
-            self.driver = uc.Chrome(options=options)
-            # Set page load timeout
-            self.driver.set_page_load_timeout(30)
-        return self.driver
+            RawStatistics.objects.filter(staging__in=stale_staging).delete()
+            stale_staging.delete()
+
+        fields = {"content_hash": content_hash, **validators}
+        fingerprint = self.duplicates.fingerprint(text)
+        canonical = self._find_canonical(fingerprint, url) if fingerprint is not None else None
+        if canonical:
+            self.logger.info(f"{url} is a near-duplicate of {canonical.url}")
+            fields.update(processed=Staging.STATUS_DUPLICATE, duplicate_of=canonical)
+
+        saved = self._save_to_staging(self._split_and_return_content(url, text), **fields)
+        # The page's first row stands for it in the near-duplicate index once it is saved, so
+        # no page is linked to a row that is not in the database yet
+        if fingerprint is not None and not canonical and saved:
+            self.duplicates.add(fingerprint, saved[0].uuid)
+        return True
+
+    def _find_canonical(self, fingerprint, url):
+        """
+        The company's staged page that a page's text nearly duplicates, if any
+        """
+        for staging_uuid in self.duplicates.find(fingerprint):
+            canonical = (
+                Staging.objects.filter(uuid=staging_uuid, company=self.company, defunct=False)
+                .exclude(url_hash=Staging.hash_url(url))
+                .first()
+            )
+            if canonical:
+                return canonical
+        return None
+
+    def _refresh_staging(self, url, **validators):
+        """
+        Marks the staged copy of an unchanged page as current
+        """
+        validators = {field: value for field, value in validators.items() if value}
+        self._staged_rows(url).update(updated_at=timezone.now(), **validators)
 
     def _make_request(self, url):
-        """Try different methods to bypass Cloudflare"""
-        methods = [self._try_cloudscraper, self._try_selenium, self._try_regular_request]
+        """
+        Try different methods to bypass Cloudflare, starting with the one that has been getting
+        through to the host, otherwise the cheapest. A host that is still throttling after the
+        rate-limited retries raises HostUnavailable without counting against the method.
+        """
+        methods = {
+            REGULAR_REQUEST: self._try_regular_request,
+            CLOUDSCRAPER: self._try_cloudscraper,
+            SELENIUM: self._try_selenium,
+        }
+        host = urlparse(url).netloc
+        if self.fetch_cache.replay:
+            return self._replay(url)
 
-        for method in methods:
+        for name in self.bypass.order(host, FETCH_METHODS):
             try:
-                response = method(url)
+                # Each attempt waits for the host's rate limit instead of a fixed pause, and
+                # throttled responses are retried with the same method
+                response = self._limited_request(methods[name], url)
+                self._defer_if_throttled(host, response)
                 if response and "Verifying your connection" not in response.text:
+                    self.bypass.record(host, name, True)
+                    self._cache_response(url, response)
                     return response
-                time.sleep(2)  # Wait between attempts
+                self.bypass.record(host, name, False)
+            except requests.RequestException as e:
+                self.bypass.record(host, name, False)
+                self.logger.warning(f"Method {name} failed for {url}: {e}")
+                continue
+            except (HostUnavailable, ResponseTooLarge):
+                # Another method would only be throttled too, or download the same body again
+                raise
             except Exception as e:
-                self.logger.warning(f"Method {method.__name__} failed for {url}: {e}")
+                self.bypass.record(host, name, False)
+                self.logger.warning(f"Method {name} failed for {url}: {e}")
                 continue
 
         raise Exception("All bypass methods failed")
@@ -308,16 +641,26 @@ class Scraper:
                 return response
 
             # If direct request fails, try with proxy
-            proxies = self._get_proxy()
-            if proxies:
+            host = urlparse(url).netloc
+            proxy = self.proxies.choose(host)
+            if proxy:
                 try:
-                    return self.scraper.get(
-                        url, timeout=30, allow_redirects=True, proxies=proxies
+                    proxied = self.scraper.get(
+                        url,
+                        timeout=30,
+                        allow_redirects=True,
+                        proxies=self.proxies.as_requests_proxies(proxy),
                     )
+                    if self._is_blocked(proxied):
+                        self.proxies.record(proxy, False, host=host)
+                        return response
+                    self.proxies.record(proxy, True, proxied.elapsed.total_seconds())
+                    return proxied
                 except Exception as proxy_error:
+                    self.proxies.record(proxy, False, host=host)
                     self.logger.warning(f"Cloudscraper failed with proxy: {proxy_error}")
-                    # Fall back to direct request
-                    return self.scraper.get(url, timeout=30, allow_redirects=True)
+                    # Fall back to the direct response
+                    return response
 
             return response
         except Exception as e:
@@ -325,43 +668,20 @@ class Scraper:
             raise
 
     def _try_selenium(self, url):
-        """Try using undetected-chromedriver"""
+        """Try using undetected-chromedriver from the worker's browser pool"""
         try:
-            # Initialize new driver instance for each request
-            options = uc.ChromeOptions()
-            options.add_argument("--headless")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--window-size=1920,1080")
-            options.add_argument("--disable-blink-features=AutomationControlled")
-
-            # Use fresh driver instance
-            driver = uc.Chrome(options=options)
-            driver.set_page_load_timeout(30)
-
-            driver.get(url)
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-
-            if "Verifying your connection" in driver.page_source:
-                time.sleep(5)
-
-            class SeleniumResponse:
-                def __init__(self, driver):
-                    self.text = driver.page_source
-                    self.content = driver.page_source.encode("utf-8")
-                    self.status_code = 200
-
-            response = SeleniumResponse(driver)
-            driver.quit()  # Clean up immediately
-            return response
+            with get_browser_pool().browser() as driver:
+                driver.get(url)
+                WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
+                )
+
+                if "Verifying your connection" in driver.page_source:
+                    time.sleep(5)
+
+                return SeleniumResponse(driver.page_source)
         except Exception as e:
             self.logger.error(f"Selenium request failed: {e}")
-            if "driver" in locals():
-                try:
-                    driver.quit()
-                except Exception:
-                    pass
             raise
 
     def _try_regular_request(self, url):
@@ -380,53 +700,33 @@ class Scraper:
             "DNT": "1",
         }
 
-        session = requests.Session()
-        return session.get(url, headers=headers, timeout=30, verify=False)
-
-    def __del__(self):
-        """Cleanup method"""
-        if self.driver:
-            try:
-                self.driver.quit()
-            except Exception as e:
-                self.logger.error(f"Error while quitting driver: {e}")
-                pass
+        return self.session.get(url, headers=headers, timeout=30)
 
     def _get_random_user_agent(self):
         return random.choice(self.user_agents)
 
-    def _extract_links(self, content, base_url):
-        """
-        Extracts links from HTML content
-        """
+    def _extract_page(self, content, base_url, content_type=""):
         try:
-            soup = BeautifulSoup(content, "html.parser")
-
-            # Check for security check page
-            if soup.find(text=re.compile(r"Verifying your connection|Security check", re.I)):
-                self.logger.warning(f"Security check page detected for {base_url}")
-                return set()
-
-            links = set()
-            for a_tag in soup.find_all("a", href=True):
-                href = a_tag["href"]
-                if not href or href.startswith(("#", "javascript:", "mailto:", "tel:")):
-                    continue
-
-                # Handle relative URLs
-                full_url = urljoin(base_url, href)
-
-                # Only include URLs that are part of the base domain
-                if self._is_same_domain(full_url):
-                    links.add(full_url)
-
-            if not links:
-                self.logger.warning(f"No links found in content from {base_url}")
-
-            return links
+            return extract_page(content, base_url, content_type=content_type)
         except Exception as e:
             self.logger.error(f"Error extracting links from content: {e}")
-            return set()
+            return None
+
+    def _same_domain_links(self, page, base_url):
+        if page.challenge:
+            self.logger.warning(f"Security check page detected for {base_url}")
+            return {}
+
+        # Anchor text feeds the crawl frontier's relevance score
+        links = {
+            url: anchor[: self.ANCHOR_TEXT_MAX_LENGTH]
+            for url, anchor in page.links.items()
+            if self._is_same_domain(url)
+        }
+        if not links:
+            self.logger.warning(f"No links found in content from {base_url}")
+
+        return links
 
     def _is_same_domain(self, url):
         """
@@ -445,77 +745,46 @@ class Scraper:
             return False
 
     def _normalize_url(self, url):
-        """Normalize URL by removing fragments, sorting query parameters, etc."""
-        parsed = urlparse(url)
-        # Remove fragment and normalize path
-        normalized = parsed._replace(
-            fragment="",
-            path=parsed.path.rstrip("/"),
-            query="&".join(sorted(parsed.query.split("&"))) if parsed.query else "",
-        )
-        return urlunparse(normalized)
+        """Normalize URL by dropping fragments and tracking parameters, sorting the query, etc."""
+        return canonicalize_url(url)
 
-    @lru_cache(maxsize=100)
-    def _get_proxy(self):
-        """Get a cached working proxy with parallel testing"""
-        current_time = time.time()
-        if current_time - self.last_proxy_refresh > self.proxy_refresh_interval:
-            self._refresh_proxy_pool()
-            self.last_proxy_refresh = current_time
-
-        if self.proxy_cache:
-            return choice(list(self.proxy_cache.items()))
-
-        return None
-
-    def _refresh_proxy_pool(self):
-        """Refresh the proxy pool with parallel testing"""
-        try:
-            response = requests.get(
-                "https://raw.githubusercontent.com/clarketm/proxy-list/master/proxy-list-raw.txt",
-                timeout=10,
-            )
-            proxies = response.text.split("\n")[:100]  # Only take first 100 proxies
-
-            # Test proxies in parallel
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.max_parallel_proxy_tests
-            ) as executor:
-                future_to_proxy = {
-                    executor.submit(self._test_proxy, proxy.strip()): proxy.strip()
-                    for proxy in proxies
-                    if proxy.strip()
-                }
-
-                for future in concurrent.futures.as_completed(future_to_proxy):
-                    proxy = future_to_proxy[future]
-                    try:
-                        if future.result():
-                            self.proxy_cache[proxy] = time.time()
-                    except Exception:
-                        pass
-
-            # Clean up old proxies
-            current_time = time.time()
-            self.proxy_cache = {
-                proxy: timestamp
-                for proxy, timestamp in self.proxy_cache.items()
-                if current_time - timestamp < self.proxy_refresh_interval
-            }
-
-        except Exception as e:
-            self.logger.error(f"Error refreshing proxy pool: {e}")
+    def _resolve_urls(self, urls):
+        """
+        Maps URLs to their normalized form, followed to the canonical URL if it is a known alias
+        """
+        normalized = {url: self._normalize_url(url) for url in urls}
+        canonical = self.canonical_urls.resolve(normalized.values())
+        return {url: canonical[normalized_url] for url, normalized_url in normalized.items()}
 
-    def _test_proxy(self, proxy):
-        """Optimized proxy testing"""
-        try:
-            test_url = self.start_url or "http://httpbin.org/ip"
-            session = requests.Session()
-            response = session.get(
-                test_url,
-                proxies={"http": f"http://{proxy}", "https": f"http://{proxy}"},
-                timeout=self.proxy_timeout,
-            )
-            return response.status_code == 200
-        except Exception:
-            return False
+    def _canonical_links(self, links):
+        """
+        Resolves {url: anchor text} to canonical URLs, keeping the longest anchor of aliases
+        """
+        canonical_links = {}
+        for url, canonical in self._resolve_urls(links).items():
+            anchor = links[url]
+            if len(canonical_links.get(canonical, "")) <= len(anchor):
+                canonical_links[canonical] = anchor
+        return canonical_links
+
+    def _canonical_url(self, url, response=None, page=None):
+        """
+        The URL a fetched page is staged under: its rel=canonical link or, failing that, the
+        URL it was redirected to, as long as it stays on the site. The page's own URL is
+        recorded as an alias of it.
+        """
+        url = self._resolve_urls([url])[url]
+        declared = page.canonical if page is not None and not page.challenge else ""
+        # A common misconfiguration declares the home page canonical for every page
+        if declared and urlparse(url).path.strip("/") and not urlparse(declared).path.strip("/"):
+            declared = ""
+        redirected = str(getattr(response, "url", "") or "")
+
+        for candidate in (declared, redirected):
+            if candidate and self._is_same_domain(candidate):
+                canonical = self._normalize_url(candidate)
+                if canonical != url:
+                    self.canonical_urls.record(url, canonical)
+                    self.logger.info(f"{url} is an alias of {canonical}")
+                return canonical
+        return url
@@ -109,12 +109,171 @@ CELERY_QUEUE_GENERAL = "gd_general"
 CELERY_QUEUE_SCRAPE = "gd_scrape"
 CELERY_QUEUE_PRE_STAGING = "gd_pre_staging"
 CELERY_QUEUE_POST_STAGING = "gd_post_staging"
+CELERY_QUEUE_PARSE = "gd_parse"
 
 # Add these rate limits under the queue definitions
 CELERY_RATE_LIMIT_GENERAL = os.getenv("CELERY_RATE_LIMIT_GENERAL", "10/s")
 CELERY_RATE_LIMIT_SCRAPE = os.getenv("CELERY_RATE_LIMIT_SCRAPE", "60/s")
 CELERY_RATE_LIMIT_PRE_STAGING = os.getenv("CELERY_RATE_LIMIT_PRE_STAGING", "40/s")
 CELERY_RATE_LIMIT_POST_STAGING = os.getenv("CELERY_RATE_LIMIT_POST_STAGING", "40/s")
+CELERY_RATE_LIMIT_PARSE = os.getenv("CELERY_RATE_LIMIT_PARSE", "60/s")
+
+# Parsing a single fetched document on gd_parse: soft limit (the document is given up) and
+# hard limit (the worker process is replaced)
+CELERY_PARSE_SOFT_TIME_LIMIT = int(os.getenv("CELERY_PARSE_SOFT_TIME_LIMIT", 120))
+CELERY_PARSE_TIME_LIMIT = int(os.getenv("CELERY_PARSE_TIME_LIMIT", 150))
+# Seconds a fetched document waits in Redis for a gd_parse worker before it is dropped
+PARSE_DOCUMENT_TTL = int(os.getenv("PARSE_DOCUMENT_TTL", 60 * 60 * 6))
+# Fetched PDFs travel to gd_parse as files in PARSE_DOCUMENT_BACKEND storage rather than through
+# Redis: "disk" under PARSE_DOCUMENT_DIR, shared by the workers, or "s3" in
+# PARSE_DOCUMENT_BUCKET. Files left after PARSE_DOCUMENT_TTL are removed every
+# PARSE_DOCUMENT_EVICT_INTERVAL seconds.
+PARSE_DOCUMENT_BACKEND = os.getenv("PARSE_DOCUMENT_BACKEND", "disk")
+PARSE_DOCUMENT_DIR = os.getenv("PARSE_DOCUMENT_DIR", os.path.join(BASE_DIR, "parse_documents"))
+PARSE_DOCUMENT_BUCKET = os.getenv("PARSE_DOCUMENT_BUCKET", REPORTS_BUCKET)
+PARSE_DOCUMENT_LOCATION = "parse-documents"
+PARSE_DOCUMENT_EVICT_INTERVAL = int(os.getenv("PARSE_DOCUMENT_EVICT_INTERVAL", 60 * 60))
+# A crawl task stays open until the documents it queued are parsed, checking every
+# PARSE_WAIT_INTERVAL seconds for at most PARSE_WAIT_TIMEOUT, so the report waits for them
+PARSE_WAIT_INTERVAL = int(os.getenv("PARSE_WAIT_INTERVAL", 15))
+PARSE_WAIT_TIMEOUT = int(os.getenv("PARSE_WAIT_TIMEOUT", 60 * 60 * 2))
+
+# -------------------------- Crawl Configurations --------------------------
+# Concurrent page fetches for a single domain crawl
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 16))
+# Politeness slots: in-flight requests per host
+CRAWL_HOST_CONCURRENCY = int(os.getenv("CRAWL_HOST_CONCURRENCY", 4))
+# Adaptive per-host rate limit shared through Redis: starting, minimum and maximum requests per
+# second, burst size, additive increase per fast response, multiplicative decrease on 429/503
+# and the response latency above which a host is slowed down
+CRAWL_HOST_RATE = float(os.getenv("CRAWL_HOST_RATE", 2))
+CRAWL_HOST_MIN_RATE = float(os.getenv("CRAWL_HOST_MIN_RATE", 0.1))
+CRAWL_HOST_MAX_RATE = float(os.getenv("CRAWL_HOST_MAX_RATE", 20))
+CRAWL_HOST_BURST = float(os.getenv("CRAWL_HOST_BURST", 4))
+CRAWL_HOST_RATE_INCREASE = float(os.getenv("CRAWL_HOST_RATE_INCREASE", 0.2))
+CRAWL_HOST_RATE_DECREASE = float(os.getenv("CRAWL_HOST_RATE_DECREASE", 0.5))
+CRAWL_HOST_TARGET_LATENCY = float(os.getenv("CRAWL_HOST_TARGET_LATENCY", 3))
+# Circuit breaker: consecutive failures that pause a host, base pause in seconds, and the
+# longest a request waits for a paused host before it is skipped or rescheduled
+CRAWL_HOST_BREAKER_FAILURES = int(os.getenv("CRAWL_HOST_BREAKER_FAILURES", 5))
+CRAWL_HOST_BREAKER_COOLDOWN = float(os.getenv("CRAWL_HOST_BREAKER_COOLDOWN", 60))
+CRAWL_HOST_MAX_WAIT = float(os.getenv("CRAWL_HOST_MAX_WAIT", 120))
+
+# Pooled keep-alive HTTP sessions per worker process: hosts with a cached connection pool,
+# connections per host, seconds a request waits for a free connection, and seconds a DNS
+# lookup is cached (0 disables the cache)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 32))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 8))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 60))
+HTTP_DNS_CACHE_TTL = float(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+
+# Proxy health service: candidate list and test target, test timeout and parallelism, new
+# candidates taken per refresh and how often the pool is refreshed
+PROXY_LIST_URL = os.getenv(
+    "PROXY_LIST_URL",
+    "https://raw.githubusercontent.com/clarketm/proxy-list/master/proxy-list-raw.txt",
+)
+PROXY_TEST_URL = os.getenv("PROXY_TEST_URL", "http://httpbin.org/ip")
+PROXY_TEST_TIMEOUT = float(os.getenv("PROXY_TEST_TIMEOUT", 5))
+PROXY_TEST_WORKERS = int(os.getenv("PROXY_TEST_WORKERS", 20))
+PROXY_MAX_CANDIDATES = int(os.getenv("PROXY_MAX_CANDIDATES", 100))
+PROXY_REFRESH_INTERVAL = int(os.getenv("PROXY_REFRESH_INTERVAL", 300))
+# Proxy selection: weighted choice among the best-scored proxies, kept per host for the sticky
+# TTL; proxies below the minimum success rate after enough samples are dropped
+PROXY_CHOICE_SIZE = int(os.getenv("PROXY_CHOICE_SIZE", 20))
+PROXY_STICKY_TTL = int(os.getenv("PROXY_STICKY_TTL", 600))
+PROXY_MIN_SAMPLES = int(os.getenv("PROXY_MIN_SAMPLES", 3))
+PROXY_MIN_SUCCESS_RATE = float(os.getenv("PROXY_MIN_SUCCESS_RATE", 0.3))
+PROXY_STATS_TTL = int(os.getenv("PROXY_STATS_TTL", 60 * 60 * 24))
+# Pages that need the cloudscraper/selenium bypass chain are fetched in threads, one at a time
+CRAWL_FALLBACK_CONCURRENCY = int(os.getenv("CRAWL_FALLBACK_CONCURRENCY", 1))
+CRAWL_DISPATCH_BATCH_SIZE = int(os.getenv("CRAWL_DISPATCH_BATCH_SIZE", 50))
+CRAWL_REQUEST_TIMEOUT = float(os.getenv("CRAWL_REQUEST_TIMEOUT", 30))
+# Stage page text straight from the crawl response instead of re-fetching it per URL
+CRAWL_SINGLE_FETCH = to_bool(os.getenv("CRAWL_SINGLE_FETCH", True))
+# Redis crawl frontier: crawl tasks per domain, URL lease length, idle TTL and idle poll interval
+CRAWL_FRONTIER_SHARDS = int(os.getenv("CRAWL_FRONTIER_SHARDS", 4))
+CRAWL_FRONTIER_LEASE_SECONDS = int(os.getenv("CRAWL_FRONTIER_LEASE_SECONDS", 300))
+CRAWL_FRONTIER_TTL = int(os.getenv("CRAWL_FRONTIER_TTL", 60 * 60 * 48))
+CRAWL_FRONTIER_POLL_INTERVAL = float(os.getenv("CRAWL_FRONTIER_POLL_INTERVAL", 2))
+# A crawl task stops claiming URLs this many seconds before its soft time limit, finishes the
+# pages in hand and hands its shard on to a new task
+CRAWL_TASK_STOP_MARGIN = int(os.getenv("CRAWL_TASK_STOP_MARGIN", 120))
+# Candidate URLs the ranked frontier may hold, as a multiple of MAX_LINKS
+CRAWL_FRONTIER_CANDIDATE_FACTOR = int(os.getenv("CRAWL_FRONTIER_CANDIDATE_FACTOR", 4))
+# False-positive rate of the Bloom filters tracking visited URLs (a hit skips a new URL)
+CRAWL_VISITED_ERROR_RATE = float(os.getenv("CRAWL_VISITED_ERROR_RATE", 0.001))
+# Seed crawls from robots.txt and sitemaps, capped in URLs collected and sitemap files read
+CRAWL_USE_SITEMAPS = to_bool(os.getenv("CRAWL_USE_SITEMAPS", True))
+CRAWL_SITEMAP_MAX_URLS = int(os.getenv("CRAWL_SITEMAP_MAX_URLS", 100000))
+CRAWL_SITEMAP_MAX_FILES = int(os.getenv("CRAWL_SITEMAP_MAX_FILES", 50))
+# Record the responses of each crawl to a WARC file in this directory (empty disables), to be
+# replayed by the serve_crawl_fixture and benchmark_crawl commands
+CRAWL_WARC_DIR = os.getenv("CRAWL_WARC_DIR", "")
+# HTML text and link extraction backend: "lxml" (libxml2, falls back to BeautifulSoup on
+# documents it rejects) or "bs4"
+HTML_EXTRACTION_BACKEND = os.getenv("HTML_EXTRACTION_BACKEND", "lxml")
+# Strip text blocks repeated across a site's pages. Block frequencies are learned from the
+# first BOILERPLATE_LEARN_PAGES pages; a block seen on at least BOILERPLATE_MIN_PAGES pages and
+# BOILERPLATE_MIN_RATIO of them is boilerplate. What was learned is kept for BOILERPLATE_TTL.
+BOILERPLATE_FILTER = to_bool(os.getenv("BOILERPLATE_FILTER", True))
+BOILERPLATE_LEARN_PAGES = int(os.getenv("BOILERPLATE_LEARN_PAGES", 200))
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", 5))
+BOILERPLATE_MIN_RATIO = float(os.getenv("BOILERPLATE_MIN_RATIO", 0.4))
+BOILERPLATE_TTL = int(os.getenv("BOILERPLATE_TTL", 60 * 60 * 24 * 30))
+# Stage near-duplicate pages (SimHash fingerprints of their text within DEDUP_MAX_DISTANCE
+# bits, at most 7) as duplicates of the first copy. Pages under DEDUP_MIN_WORDS are not compared.
+DEDUP_NEAR_DUPLICATES = to_bool(os.getenv("DEDUP_NEAR_DUPLICATES", True))
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 6))
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", 50))
+DEDUP_INDEX_TTL = int(os.getenv("DEDUP_INDEX_TTL", 60 * 60 * 24 * 30))
+# URLs are canonicalized before they are crawled or staged: query parameters matching
+# CANONICAL_STRIP_PARAMS (comma-separated, * wildcards) are dropped, and redirects and
+# rel=canonical links are remembered as aliases for CANONICAL_ALIAS_TTL
+CANONICAL_STRIP_PARAMS = os.getenv(
+    "CANONICAL_STRIP_PARAMS",
+    "utm_*,gclid,gbraid,wbraid,dclid,fbclid,msclkid,yclid,mc_cid,mc_eid,_ga,_gl,_hsenc,_hsmi,"
+    "hsctatracking,mkt_tok,ref_src,sessionid,session_id,sid,phpsessid,jsessionid",
+)
+CANONICAL_LOWERCASE_PATHS = to_bool(os.getenv("CANONICAL_LOWERCASE_PATHS", False))
+CANONICAL_ALIAS_TTL = int(os.getenv("CANONICAL_ALIAS_TTL", 60 * 60 * 24 * 30))
+# Which fetch methods got through to each host is remembered for BYPASS_MEMORY_TTL, fading with
+# a half-life of BYPASS_MEMORY_HALF_LIFE seconds
+BYPASS_MEMORY_HALF_LIFE = int(os.getenv("BYPASS_MEMORY_HALF_LIFE", 60 * 60 * 6))
+BYPASS_MEMORY_TTL = int(os.getenv("BYPASS_MEMORY_TTL", 60 * 60 * 24 * 7))
+# Raw responses are cached for re-processing in FETCH_CACHE_BACKEND ("disk" under
+# FETCH_CACHE_DIR, "s3" in FETCH_CACHE_BUCKET, empty to disable). Entries expire after
+# FETCH_CACHE_TTL and the cache is trimmed to FETCH_CACHE_MAX_BYTES every
+# FETCH_CACHE_EVICT_INTERVAL seconds. With FETCH_CACHE_REPLAY, pages come only from the cache.
+FETCH_CACHE_BACKEND = os.getenv("FETCH_CACHE_BACKEND", "")
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", os.path.join(BASE_DIR, "fetch_cache"))
+FETCH_CACHE_BUCKET = os.getenv("FETCH_CACHE_BUCKET", REPORTS_BUCKET)
+FETCH_CACHE_LOCATION = "fetch-cache"
+FETCH_CACHE_TTL = int(os.getenv("FETCH_CACHE_TTL", 60 * 60 * 24 * 7))
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", 5 * 1024 * 1024 * 1024))
+FETCH_CACHE_EVICT_INTERVAL = int(os.getenv("FETCH_CACHE_EVICT_INTERVAL", 60 * 60))
+FETCH_CACHE_REPLAY = to_bool(os.getenv("FETCH_CACHE_REPLAY", False))
+
+# Headless browser pool per worker process: warm instances, pages per browser before it is
+# recycled, memory ceiling per browser process tree, how long to wait for a free browser and
+# seconds an unused browser is kept running (0 keeps it until it is recycled)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+BROWSER_POOL_MAX_PAGES = int(os.getenv("BROWSER_POOL_MAX_PAGES", 50))
+BROWSER_POOL_MAX_MEMORY_MB = int(os.getenv("BROWSER_POOL_MAX_MEMORY_MB", 1024))
+BROWSER_POOL_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_POOL_ACQUIRE_TIMEOUT", 120))
+BROWSER_POOL_IDLE_TIMEOUT = float(os.getenv("BROWSER_POOL_IDLE_TIMEOUT", 300))
+
+# Scraper contexts (company, sessions, per-domain bypass state) cached per worker process:
+# how many domains are kept and for how many seconds a context is reused
+SCRAPER_CONTEXT_SIZE = int(os.getenv("SCRAPER_CONTEXT_SIZE", 32))
+SCRAPER_CONTEXT_TTL = float(os.getenv("SCRAPER_CONTEXT_TTL", 600))
+# PDFs are streamed to a temporary file kept in memory up to this size, on disk beyond it
+SCRAPER_PDF_SPOOL_BYTES = int(os.getenv("SCRAPER_PDF_SPOOL_BYTES", 8 * 1024 * 1024))
+# Largest response body downloaded per content type: HTML and other text, PDFs, anything else.
+# Larger responses are abandoned, up front when they declare their Content-Length.
+SCRAPER_MAX_HTML_BYTES = int(os.getenv("SCRAPER_MAX_HTML_BYTES", 5 * 1024 * 1024))
+SCRAPER_MAX_PDF_BYTES = int(os.getenv("SCRAPER_MAX_PDF_BYTES", 50 * 1024 * 1024))
+SCRAPER_MAX_OTHER_BYTES = int(os.getenv("SCRAPER_MAX_OTHER_BYTES", 1024 * 1024))
 
 # Enable task events for monitoring
 CELERY_SEND_TASK_EVENTS = True
@@ -125,7 +284,23 @@ CELERY_FLOWER_USER = os.getenv("CELERY_FLOWER_USER", "admin")
 CELERY_FLOWER_PASSWORD = os.getenv("CELERY_FLOWER_PASSWORD", "admin")
 
 # TODO: Change schedule to run at 12am and 1pm everyday
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    "refresh-proxy-pool": {
+        "task": "detective.tasks.general.refresh_proxy_pool",
+        "schedule": PROXY_REFRESH_INTERVAL,
+        "options": {"queue": CELERY_QUEUE_GENERAL, "expires": PROXY_REFRESH_INTERVAL},
+    },
+    "evict-fetch-cache": {
+        "task": "detective.tasks.general.evict_fetch_cache",
+        "schedule": FETCH_CACHE_EVICT_INTERVAL,
+        "options": {"queue": CELERY_QUEUE_GENERAL, "expires": FETCH_CACHE_EVICT_INTERVAL},
+    },
+    "evict-parse-documents": {
+        "task": "detective.tasks.general.evict_parse_documents",
+        "schedule": PARSE_DOCUMENT_EVICT_INTERVAL,
+        "options": {"queue": CELERY_QUEUE_GENERAL, "expires": PARSE_DOCUMENT_EVICT_INTERVAL},
+    },
+}
 
 LOG_ROOT = os.path.join(BASE_DIR, "logs")
 boto3_logs_client = None
@@ -455,6 +630,12 @@ REDIS_CONN = redis.Redis(
     db=int(os.getenv("REDIS_DB", 0)),
     decode_responses=True,
 )
+# Same Redis for raw bytes, such as fetched documents waiting to be parsed
+REDIS_BINARY_CONN = redis.Redis(
+    host=os.getenv("REDIS_HOST", "redis"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=int(os.getenv("REDIS_DB", 0)),
+)
 
 CELERY_BROKER_TRANSPORT_OPTIONS = {
     "max_retries": 3,